@@ -0,0 +1,454 @@
+"""Benchmarks for extract_entities.py
+
+Usage: python benchmark_extract.py [--pages N] [--repeat N] [--bench NAME] [--model NAME]
+                                   [--sizes 1,10,100,500] [--seed N] [--output FILE] [--corpus-dir DIR]
+                                   [--worst-case-sizes 2000,8000,32000] [--extractor-timeout S] [--document-timeout S]
+"""
+import argparse
+import contextlib
+import importlib.metadata
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import extract_entities as ee
+from check_clean_text import legacy_clean_text
+
+# One page of UOB-style letter of offer text, including the usual OCR noise
+SAMPLE_PAGE = """CamScanner
+UNITED OVERSEAS BANK (MALAYSIA) BHD (271809-K)
+Level 5, UOB Plaza 1 Kuala Lumpur
+No. 7, Jalan Raja Laut, 50350 Kuala Lumpur, Malaysia
+
+Subject: Banking Facilities for ABC Holdings Sdn Bhd (123456)
+Approved Limit Banking Facilities
+"7000,006:00" Temtoanst(TL)
+1425000000 TOTAL
+The Bark’s trest rate shall be 1o5 per cent per annum above the Base Lending Rate.
+HSD No. 12345, PTD No: 6789 Mukim of Setapak, District of Kuala Lumpur, State of Wilayah Persekutuan.
+Tenure: Freehold
+The Borrower shall pay all costs and expenses in connection with the facilities
+and the security documents, whether or not the facilities are utilised.
+"""
+
+def make_document(pages):
+    """Build a multi-page OCR document with Tesseract form feeds between pages"""
+    return "\f".join(SAMPLE_PAGE for _ in range(pages))
+
+# Synthetic corpus: every document opens with a bank letter and continues with property
+# schedules, boilerplate terms and OCR noise, separated by Tesseract form feeds
+CORPUS_KINDS = ("uob", "maybank", "cimb", "noise")
+CORPUS_SIZES = (1, 10, 100, 500)
+CORPUS_SEED = 42
+
+DISTRICTS = ["Petaling", "Hulu Langat", "Klang", "Gombak", "Johor Bahru", "Seberang Perai Tengah", "Kinta", "Kuala Lumpur"]
+STATES = ["Selangor", "Johor", "Pulau Pinang", "Perak", "Wilayah Persekutuan", "Negeri Sembilan"]
+TOWNS = [("Petaling Jaya", "47301"), ("Shah Alam", "40150"), ("Johor Bahru", "80100"), ("Ipoh", "30450"), ("Kajang", "43000")]
+TENURES = ["Freehold", "Leasehold 99 years expiring 2111", "Leasehold 60 years"]
+PROPERTY_TYPES = ["Condominium", "Double Storey Terrace House", "Shop Office", "Serviced Apartment"]
+COMPANIES = ["ABC Holdings", "Sinar Jaya Properties", "Mega Teguh Development", "Lim Brothers Trading"]
+
+UOB_LETTER = """CamScanner
+UNITED OVERSEAS BANK (MALAYSIA) BHD (271809-K)
+Level {level}, UOB Plaza 1 Kuala Lumpur
+No. 7, Jalan Raja Laut, 50350 Kuala Lumpur, Malaysia
+
+Subject: Banking Facilities for {company} Sdn Bhd ({reg_no})
+Approved Limit Banking Facilities
+"{tl_head},{tl_tail}:00" Temtoanst(TL)
+{tl2}-00 Term Loan 2 (TL2)
+{total} TOTAL
+The Bark’s trest rate shall be 1o5 per cent per annum above the Base Lending Rate.
+"""
+
+RETAIL_LETTER = """{header}
+Date: {day} March 2024
+Subject: Letter of Offer for a Housing Loan to {company} Sdn Bhd ({reg_no})
+Dear Sir/Madam,
+We are pleased to offer the Term Loan facility for the property located at No. {lot}, Jalan {street}, {town}, {postcode} {town}.
+Amount of RM {amount}
+Earnest Deposit of RM {deposit}
+MRTA Amount of RM {mrta}
+Balance of RM {balance}
+Company Reg. No. {company_no}
+"""
+
+BANK_HEADERS = {
+    "maybank": "MALAYAN BANKING BERHAD (3813-K)\nMaybank, Menara Maybank, 100 Jalan Tun Perak, 50050 Kuala Lumpur",
+    "cimb": "CIMB Bank Berhad (13491-P)\nMenara CIMB, Jalan Stesen Sentral 2, 50470 Kuala Lumpur",
+}
+
+PROPERTY_SCHEDULE = """SCHEDULE OF PROPERTY
+HSD No. {hsd}, PTD No: {ptd} Mukim of {mukim}, District of {district}, State of {state}.
+Parcel No. {parcel}, Storey No. {storey}, Car Park No {car_park}, Unit No: {unit}
+Residential Area: Taman {area}
+Land Office of {district}, Sub-district of {mukim}
+Tenure: {tenure}
+Title: Geran Mukim {title_no}
+Property Type: {property_type}
+Category: Building
+"""
+
+TERMS_PAGE = """TERMS AND CONDITIONS
+The Borrower shall pay all costs and expenses in connection with the facilities
+and the security documents, whether or not the facilities are utilised.
+“Business Day” means a day on which banks are open for business in Kuala Lumpur.
+Interest shall be calculated on a daily basis at {rate} per cent per annum – subject to review.
+The Bank may at any time review the facilities and the Borrower’s accounts.
+"""
+
+NOISE_WORDS = ["CamScanner", "the", "and", "ot", "rn", "lll", "||", "~", "Bhd", "RM", "1o5", "2o", "Ja1an", "::", "..", "‘", "”", "—", "Kua1a", "tbe"]
+
+def _digits(rng, count):
+    return str(rng.randint(10 ** (count - 1), 10 ** count - 1))
+
+def _money(rng, low, high):
+    return f"{rng.randint(low, high):,}.00"
+
+def make_letter_page(rng, kind):
+    """First page of a synthetic document: a UOB facility table or a Maybank/CIMB offer letter"""
+    company = rng.choice(COMPANIES)
+    if kind == "uob":
+        term_loan = _digits(rng, 7)
+        return UOB_LETTER.format(level=rng.randint(1, 30), company=company, reg_no=_digits(rng, 6),
+                                 tl_head=term_loan[:4], tl_tail=term_loan[4:], tl2=_digits(rng, 7), total=_digits(rng, 10))
+    if kind in BANK_HEADERS:
+        town, postcode = rng.choice(TOWNS)
+        return RETAIL_LETTER.format(header=BANK_HEADERS[kind], day=rng.randint(1, 28), company=company,
+                                    reg_no=_digits(rng, 6), lot=rng.randint(1, 200), street=rng.choice(DISTRICTS),
+                                    town=town, postcode=postcode, amount=_money(rng, 200_000, 2_000_000),
+                                    deposit=_money(rng, 10_000, 100_000), mrta=_money(rng, 5_000, 50_000),
+                                    balance=_money(rng, 100_000, 1_500_000), company_no=f"{_digits(rng, 6)}-K")
+    return make_noise_page(rng)
+
+def make_property_page(rng):
+    """A property schedule page with HSD/PTD numbers and location fields"""
+    return PROPERTY_SCHEDULE.format(hsd=_digits(rng, 5), ptd=_digits(rng, 4), mukim=rng.choice(DISTRICTS),
+                                    district=rng.choice(DISTRICTS), state=rng.choice(STATES),
+                                    parcel=f"A-{rng.randint(1, 40)}", storey=rng.randint(1, 40),
+                                    car_park=rng.randint(1, 500), unit=f"B{rng.randint(1, 999)}",
+                                    area=rng.choice(DISTRICTS), tenure=rng.choice(TENURES),
+                                    title_no=rng.randint(1, 9999), property_type=rng.choice(PROPERTY_TYPES))
+
+def make_noise_page(rng, lines=30):
+    """A page of OCR noise: short lines of junk words, broken digits and stray punctuation"""
+    return "\n".join(
+        " ".join(rng.choice(NOISE_WORDS) if rng.random() < 0.7 else _digits(rng, rng.randint(1, 6))
+                 for _ in range(rng.randint(3, 12)))
+        for _ in range(lines)
+    )
+
+def generate_document(rng, kind, pages):
+    """Build one synthetic OCR document of the given kind and page count"""
+    page_texts = [make_letter_page(rng, kind)]
+    for _ in range(pages - 1):
+        choice = rng.random()
+        if kind == "noise" or choice < 0.3:
+            page_texts.append(make_noise_page(rng))
+        elif choice < 0.6:
+            page_texts.append(make_property_page(rng))
+        else:
+            page_texts.append(TERMS_PAGE.format(rate=f"{rng.uniform(1, 5):.2f}"))
+    return "\f".join(page_texts)
+
+def generate_corpus(sizes=CORPUS_SIZES, seed=CORPUS_SEED, kinds=CORPUS_KINDS):
+    """Return {file_name: text} with one document per kind and page count, reproducible for a seed"""
+    rng = random.Random(seed)
+    return {f"{kind}-{pages}p.txt": generate_document(rng, kind, pages) for pages in sizes for kind in kinds}
+
+# Adversarial inputs: a pattern prefix followed by long text that almost matches, which
+# makes backtracking patterns scan the rest of the document from every position
+WORST_CASE_SIZES = (2000, 8000, 32000)
+WORST_CASE_INPUTS = {
+    "property_at": lambda filler: "The property at " + filler,
+    "company": lambda filler: filler + " Sdn Bhd",
+    "postcode": lambda filler: "50350 " + filler,
+}
+
+def make_worst_case(kind, chars, seed=CORPUS_SEED):
+    """One adversarial document of about chars characters, on a single line of OCR-like words"""
+    rng = random.Random(seed)
+    words = []
+    while sum(map(len, words)) + len(words) < chars:
+        words.append(rng.choice(NOISE_WORDS + ["Jalan", "Taman", "Lot", "Mukim", "Daerah"]))
+    return WORST_CASE_INPUTS[kind](" ".join(words))
+
+def time_call(fn, repeat):
+    """Return the median wall time of fn() in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return round(statistics.median(samples) * 1000, 3)
+
+def measure(fn, repeat, chars, pages):
+    """Time fn() and trace its peak memory, returning throughput figures for chars/pages of input"""
+    ms = time_call(fn, repeat)
+    # tracemalloc slows allocation down, so peak memory is taken on a separate, untimed run
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    seconds = max(ms / 1000, 1e-9)
+    return {
+        "ms": ms,
+        "mb_per_s": round(chars / 1e6 / seconds, 3),
+        "pages_per_s": round(pages / seconds, 1),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+def bench_clean_text(text, repeat):
+    """Compare clean_text with the original implementation, checking the output is byte-identical
+    
+    check_clean_text.py holds the full golden-output check.
+    """
+    return {
+        "identical_output": ee.clean_text(text) == legacy_clean_text(text),
+        "legacy_ms": time_call(lambda: legacy_clean_text(text), repeat),
+        "clean_text_ms": time_call(lambda: ee.clean_text(text), repeat),
+    }
+
+def bench_field_matcher(text, repeat):
+    """Compare the FieldMatcher with one search_field() call per field"""
+    cleaned = ee.clean_text(text)
+
+    def search_each_field():
+        return {field: match for field in ee.MATCHER_FIELDS if (match := ee.search_field(field, cleaned))}
+
+    def spans(matches):
+        return {field: match.span() for field, match in matches.items()}
+
+    return {
+        "identical_matches": spans(search_each_field()) == spans(ee.find_field_matches(cleaned)),
+        "per_field_search_ms": time_call(search_each_field, repeat),
+        "field_matcher_ms": time_call(lambda: ee.find_field_matches(cleaned), repeat),
+    }
+
+def bench_bank_dictionary(text, repeat):
+    """Compare the bank dictionary with one case-insensitive search per bank name, in priority order
+    
+    Bank names are removed from the sample first, so every name has to be ruled
+    out; timed for the first 7 banks of the dictionary (the original bank list)
+    and for all of them.
+    """
+    names = [name for bank in ee.BANKS for name in bank.get("aliases", []) + bank.get("misspellings", [])]
+    cleaned = ee.regex.sub("|".join(map(ee.regex.escape, names)), " ", ee.clean_text(text), flags=ee.regex.IGNORECASE)
+    results = {}
+    for bank_count in (7, len(ee.BANKS)):
+        banks = ee.BANKS[:bank_count]
+        dictionary = ee.BankDictionary(banks)
+        patterns = [(name, ee.regex.compile(ee.regex.escape(name), ee.regex.IGNORECASE))
+                    for bank in banks for name in bank.get("aliases", []) + bank.get("misspellings", [])]
+
+        def search_each_name():
+            return next((match.group(0) for _, pattern in patterns if (match := pattern.search(cleaned))), None)
+
+        found = dictionary.find(cleaned)
+        results[str(bank_count)] = {
+            "names": len(patterns),
+            "identical_match": search_each_name() == (found[0] if found else None),
+            "per_name_search_ms": time_call(search_each_name, repeat),
+            "bank_dictionary_ms": time_call(lambda: dictionary.find(cleaned), repeat),
+        }
+    return results
+
+def bench_ner_pipeline(text, model_name, repeat):
+    """Compare the full spaCy pipeline with the trimmed NER-only pipeline"""
+    full_nlp = ee.load_spacy_model(model_name, exclude=[])
+    trimmed_nlp = ee.load_spacy_model(model_name)
+    cleaned = ee.clean_text(text)
+
+    return {
+        "full_pipeline_components": full_nlp.pipe_names,
+        "trimmed_pipeline_components": trimmed_nlp.pipe_names,
+        "full_pipeline_ms": time_call(lambda: full_nlp(cleaned), repeat),
+        "trimmed_pipeline_ms": time_call(lambda: trimmed_nlp(cleaned), repeat),
+        "process_text_ms": time_call(lambda: ee.process_text(text, nlp=trimmed_nlp), repeat),
+    }
+
+def bench_cold_start(model_name, repeat):
+    """Time fresh `extract_entities.py -` processes from interpreter start to exit, as n8n runs them
+    
+    The letter with a state clause is filled by the regex extractors alone, so
+    spaCy is never imported for it; the one without needs the NER fallback and
+    loads the model, from model_name and from a snapshot of it.
+    """
+    script = ee.__file__
+    ner_text = SAMPLE_PAGE.replace("State of", "in").replace(", Malaysia", "")
+
+    def run(text, model):
+        env = dict(os.environ, SPACY_MODEL=model)
+        return lambda: subprocess.run([sys.executable, script, "-"], input=text, env=env,
+                                      capture_output=True, text=True, check=True)
+
+    results = {
+        "python_startup_ms": time_call(lambda: subprocess.run([sys.executable, "-c", "pass"], check=True), repeat),
+        "no_model_ms": time_call(run(ner_text, ee.NO_MODEL), repeat),
+        "regex_only_letter_ms": time_call(run(SAMPLE_PAGE, model_name), repeat),
+        "ner_letter_ms": time_call(run(ner_text, model_name), repeat),
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        snapshot = os.path.join(directory, "model.pickle")
+        ee.save_model_snapshot(ee.load_spacy_model(model_name), snapshot, model_name)
+        results["ner_letter_snapshot_ms"] = time_call(run(ner_text, snapshot), repeat)
+    return results
+
+def bench_ner_batch(model_name, documents, repeat):
+    """Compare one process_text call per document with process_texts batching NER through nlp.pipe"""
+    nlp = ee.load_spacy_model(model_name)
+    # Letters without a state clause or "..., Malaysia" address, so every document needs the NER fallback
+    texts = [SAMPLE_PAGE.replace("State of", "in").replace(", Malaysia", "") for _ in range(documents)]
+
+    return {
+        "documents": documents,
+        "process_text_loop_ms": time_call(lambda: [ee.process_text(text, nlp=nlp) for text in texts], repeat),
+        "process_texts_ms": time_call(lambda: ee.process_texts(texts, nlp=nlp), repeat),
+    }
+
+# Extractors timed one by one by the corpus benchmark, each called on cleaned text
+EXTRACTORS = {
+    "find_bank": ee.find_bank,
+    "extract_amounts": ee.extract_amounts,
+    "extract_address": ee.extract_address,
+    "find_field_matches": ee.find_field_matches,
+    "extract_property_details": ee.extract_property_details,
+    "extract_location_info": ee.extract_location_info,
+    "extract_title_info": ee.extract_title_info,
+    "extract_company_info": ee.extract_company_info,
+    "extract_amount_from_uob_format": ee.extract_amount_from_uob_format,
+}
+
+def bench_corpus(sizes, seed, model_name, repeat):
+    """Throughput and peak memory of each pipeline stage over the synthetic corpus, per document size"""
+    ee.use_model(model_name)
+    nlp = ee.get_nlp()
+    corpus = generate_corpus(sizes, seed)
+    results = {"seed": seed, "kinds": list(CORPUS_KINDS), "sizes": {}}
+    
+    for pages in sizes:
+        documents = {name: text for name, text in corpus.items() if name.endswith(f"-{pages}p.txt")}
+        texts = list(documents.values())
+        cleaned = [ee.clean_text(text) for text in texts]
+        chars, total_pages = sum(map(len, texts)), pages * len(texts)
+        
+        size_results = {"documents": len(texts), "pages": total_pages, "chars": chars}
+        size_results["clean_text"] = measure(lambda: [ee.clean_text(text) for text in texts], repeat, chars, total_pages)
+        size_results["extractors"] = {
+            name: measure(lambda: [extractor(text) for text in cleaned], repeat, chars, total_pages)
+            for name, extractor in EXTRACTORS.items()
+        }
+        size_results["process_text"] = measure(lambda: [ee.process_text(text, nlp=nlp) for text in texts],
+                                               repeat, chars, total_pages)
+        
+        with tempfile.TemporaryDirectory() as directory:
+            for name, text in documents.items():
+                with open(os.path.join(directory, name), 'w', encoding='utf-8') as f:
+                    f.write(text)
+            
+            def process_directory():
+                # process_all_documents reports progress on stdout, which would mix with the JSON
+                with contextlib.redirect_stdout(io.StringIO()):
+                    ee.process_all_documents(directory)
+            
+            size_results["process_all_documents"] = measure(process_directory, repeat, chars, total_pages)
+        results["sizes"][str(pages)] = size_results
+    return results
+
+def bench_worst_case(sizes, extractor_seconds, document_seconds):
+    """Time the regex extractors on adversarial documents under a time budget
+    
+    Each document is run once: without the budget a single document can take
+    minutes. The elapsed time should stay near document_seconds at any size.
+    """
+    results = {"extractor_timeout": extractor_seconds, "document_timeout": document_seconds, "inputs": {}}
+    for kind in WORST_CASE_INPUTS:
+        kind_results = {}
+        for chars in sizes:
+            cleaned = ee.clean_text(make_worst_case(kind, chars))
+            start = time.perf_counter()
+            with ee.use_budget(ee.time_budget(extractor_seconds, document_seconds)) as budget:
+                ee.extract_fields(cleaned)
+            kind_results[str(chars)] = {
+                "ms": round((time.perf_counter() - start) * 1000, 3),
+                "timeouts": sorted({timeout["extractor"] for timeout in budget.timeouts}),
+            }
+        results["inputs"][kind] = kind_results
+    return results
+
+# Benchmark name -> callable(text, args)
+BENCHMARKS = {
+    "clean_text": lambda text, args: bench_clean_text(text, args.repeat),
+    "field_matcher": lambda text, args: bench_field_matcher(text, args.repeat),
+    "bank_dictionary": lambda text, args: bench_bank_dictionary(text, args.repeat),
+    "ner_pipeline": lambda text, args: bench_ner_pipeline(text, args.model, args.repeat),
+    "ner_batch": lambda text, args: bench_ner_batch(args.model, args.pages, args.repeat),
+    "cold_start": lambda text, args: bench_cold_start(args.model, args.repeat),
+    "corpus": lambda text, args: bench_corpus(args.sizes, args.seed, args.model, args.repeat),
+    "worst_case": lambda text, args: bench_worst_case(args.worst_case_sizes, args.extractor_timeout, args.document_timeout),
+}
+
+def write_corpus(directory, sizes=CORPUS_SIZES, seed=CORPUS_SEED):
+    """Write the synthetic corpus to a directory, e.g. to time the command line on it"""
+    os.makedirs(directory, exist_ok=True)
+    for name, text in generate_corpus(sizes, seed).items():
+        with open(os.path.join(directory, name), 'w', encoding='utf-8') as f:
+            f.write(text)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark extract_entities.py")
+    parser.add_argument("--pages", type=int, default=100, help="Pages in the synthetic document (default: 100)")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed repetitions per benchmark (default: 5)")
+    parser.add_argument("--bench", action="append", choices=sorted(BENCHMARKS),
+                        help="Benchmark to run; may be repeated (default: all)")
+    parser.add_argument("--model", default=os.environ.get("SPACY_MODEL") or ee.DEFAULT_SPACY_MODEL, help="spaCy model name or path")
+    parser.add_argument("--sizes", type=lambda value: [int(size) for size in value.split(',') if size.strip()],
+                        default=list(CORPUS_SIZES),
+                        help=f"Document sizes in pages for the corpus benchmark (default: {','.join(map(str, CORPUS_SIZES))})")
+    parser.add_argument("--seed", type=int, default=CORPUS_SEED, help=f"Random seed of the synthetic corpus (default: {CORPUS_SEED})")
+    parser.add_argument("--worst-case-sizes", type=lambda value: [int(size) for size in value.split(',') if size.strip()],
+                        default=list(WORST_CASE_SIZES),
+                        help=f"Document sizes in characters for the worst_case benchmark (default: {','.join(map(str, WORST_CASE_SIZES))})")
+    parser.add_argument("--extractor-timeout", type=float, default=ee.EXTRACTOR_TIMEOUT,
+                        help=f"Per-extractor time budget for the worst_case benchmark (default: {ee.EXTRACTOR_TIMEOUT:g})")
+    parser.add_argument("--document-timeout", type=float, default=ee.DOCUMENT_TIMEOUT,
+                        help=f"Per-document time budget for the worst_case benchmark (default: {ee.DOCUMENT_TIMEOUT:g})")
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    parser.add_argument("--corpus-dir", help="Write the synthetic corpus to this directory and exit")
+    args = parser.parse_args()
+    
+    if args.corpus_dir:
+        write_corpus(args.corpus_dir, args.sizes, args.seed)
+        return
+
+    text = make_document(args.pages)
+    results = {
+        "pages": args.pages,
+        "chars": len(text),
+        "python": platform.python_version(),
+        "spacy": importlib.metadata.version("spacy"),
+        "model": args.model,
+        "extractor_version": ee.extractor_version(),
+    }
+    # Keep stdout for the JSON; model loading and progress messages go to stderr
+    with contextlib.redirect_stdout(sys.stderr):
+        for name in args.bench or sorted(BENCHMARKS):
+            results[name] = BENCHMARKS[name](text, args)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Golden-output check for clean_text
+
+Checks that clean_text gives exactly the output of the original implementation
+(legacy_clean_text below): first on fixed OCR edge cases with their expected
+output written out, then on a seeded random corpus built from the characters
+and words the cleanup rules act on. Exits with status 1 on any mismatch.
+
+Usage: python check_clean_text.py [--cases N] [--seed N]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import extract_entities as ee
+
+def legacy_clean_text(text):
+    """Reference copy of the original one-re.sub-per-fix clean_text, used as the golden output"""
+    text = re.sub(r'CamScanner', '', text)
+    text = re.sub(r'\u2018', "'", text)
+    text = re.sub(r'\u2019', "'", text)
+    text = re.sub(r'\u201c', '"', text)
+    text = re.sub(r'\u201d', '"', text)
+    text = re.sub(r'[\u2010-\u2015]', '-', text)
+    text = re.sub(r'(\d)[oO](\d)', lambda m: m.group(1) + '0' + m.group(2), text)
+    text = re.sub(r'Temtoanst', 'Term Loan', text)
+    text = re.sub(r'trest', 'interest', text)
+    text = re.sub(r'Bark\'s', 'Bank\'s', text)
+    text = re.sub(r'(\d+)[,\'](\d+)[-:](\d+)', r'\1\2.\3', text)
+    text = re.sub(r'(\d+)[-:](\d+)', r'\1.\2', text)
+    text = re.sub(r'\s{2,}', ' ', text)
+    return text.strip()
+
+# OCR edge cases -> expected clean_text output
+GOLDEN_CASES = [
+    ("1o5 per cent", "105 per cent"),
+    ("1O2", "102"),
+    ("1o0o1", "100o1"),
+    ("1 o 5", "1 o 5"),
+    ("ao5", "ao5"),
+    ("7000,006:00", "7000006.00"),
+    ("5'000:50", "5000.50"),
+    ("2’000:00", "2000.00"),
+    ("1o5:5", "105.5"),
+    ("12:30", "12.30"),
+    ("1-2-3", "1.2-3"),
+    ("1‐2", "1.2"),
+    ("1–2–b", "1.2-b"),
+    ("‘a’ “b”", "'a' \"b\""),
+    ("x‐‑‒–—―y", "x------y"),
+    ("CamScannerX", "X"),
+    ("Cam Scanner", "Cam Scanner"),
+    ("Temtoanst(TL)", "Term Loan(TL)"),
+    ("trestle", "interestle"),
+    ("Bark's", "Bank's"),
+    ("Bark’s", "Bank's"),
+    ("a \t\n b", "a b"),
+    ("a\u00a0\u00a0b", "a b"),
+    ("page1\f\fpage2", "page1 page2"),
+    ("a\fb", "a\fb"),
+    ("  x  ", "x"),
+    ("line\n", "line"),
+    ("\f", ""),
+    ("", ""),
+]
+
+# Pieces of the random corpus: everything the cleanup rules match on, plus filler
+RANDOM_TOKENS = (
+    list("0123456789oO,':-\"'. ab") + ["\u2018", "\u2019", "\u201c", "\u201d"]
+    + [chr(code) for code in range(0x2010, 0x2016)]
+    + [" ", "  ", "\t", "\n", "\f", "\r", "\u00a0"]
+    + ["CamScanner", "Cam", "Scanner", "Temtoanst", "Temto", "trest", "tre", "Bark's", "Bark’s", "Bark", "RM"]
+)
+
+def check_golden_cases():
+    """Return a description of every golden case clean_text or legacy_clean_text gets wrong"""
+    failures = []
+    for text, expected in GOLDEN_CASES:
+        for name, function in (("clean_text", ee.clean_text), ("legacy_clean_text", legacy_clean_text)):
+            output = function(text)
+            if output != expected:
+                failures.append(f"{name}({text!r}) = {output!r}, expected {expected!r}")
+    return failures
+
+def check_random_corpus(cases, seed):
+    """Return a description of every random text where clean_text differs from legacy_clean_text"""
+    rng = random.Random(seed)
+    failures = []
+    for _ in range(cases):
+        text = "".join(rng.choice(RANDOM_TOKENS) for _ in range(rng.randint(0, 40)))
+        if ee.clean_text(text) != legacy_clean_text(text):
+            failures.append(f"clean_text({text!r}) = {ee.clean_text(text)!r}, legacy gives {legacy_clean_text(text)!r}")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Check clean_text against the original implementation")
+    parser.add_argument("--cases", type=int, default=100000, help="Random texts to compare (default: 100000)")
+    parser.add_argument("--seed", type=int, default=42, help="Seed of the random corpus (default: 42)")
+    args = parser.parse_args()
+
+    failures = check_golden_cases() + check_random_corpus(args.cases, args.seed)
+    for failure in failures[:20]:
+        print(failure)
+    if failures:
+        print(f"FAILED: {len(failures)} mismatches")
+        sys.exit(1)
+    print(f"OK: {len(GOLDEN_CASES)} golden cases and {args.cases} random texts (seed {args.seed}) match")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""Differential check of the regex extractors against the original implementation
+
+The extractors now share scans: amounts come from one pass over the number
+runs (find_amount_matches), the other fields from keyword offsets
+(find_field_matches), addresses and the state from an address from a
+TextIndex, and bank names from the bank dictionary. This compares them with
+reference copies of the original one-re.search-per-pattern extractors below,
+on the benchmark corpus and on a seeded random corpus built from the
+keywords, numbers and separators the patterns act on. Exits with status 1 on
+any mismatch.
+
+Usage: python check_extractors.py [--cases N] [--seed N]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import extract_entities as ee
+from benchmark_extract import SAMPLE_PAGE, generate_corpus
+
+def legacy_extract_bank_name(text):
+    """Reference copy of the original extract_bank_name"""
+    bank_patterns = [
+        r"United Overseas Bank \(Malaysia\) Bhd",
+        r"United Overseas Bank",
+        r"UOB Bank",
+        r"UOB",
+        r"Maybank",
+        r"CIMB Bank",
+        r"HSBC Bank",
+        r"RHB Bank",
+        r"Public Bank Berhad",
+        r"Public Bank",
+        r"AmBank",
+    ]
+    for pattern in bank_patterns:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            return match.group(0)
+    return None
+
+def legacy_amount_fields(field, amount_str, print_as):
+    if '.' not in amount_str:
+        amount_str += '.00'
+    return {
+        field: float(amount_str),
+        f"{field}_print_as": f"RM {print_as}",
+        f"{field}_in_word": f"Ringgit Malaysia {print_as} only",
+    }
+
+def legacy_extract_amount_from_uob_format(text):
+    """Reference copy of the original extract_amount_from_uob_format"""
+    try:
+        term_loan_match = re.search(r"[\"\']?([\d,]+)[,\']?([\d]+)[:\"\']-?([\d]+)[\"\']?\s*(?:Term\s+Loan|Temtoanst|TL)", text)
+        if term_loan_match:
+            try:
+                amount_str = term_loan_match.group(1).replace(',', '') + term_loan_match.group(2) + '.' + term_loan_match.group(3)
+                return legacy_amount_fields("amount", amount_str, "{},{}.{}".format(*term_loan_match.group(1, 2, 3)))
+            except (ValueError, TypeError, IndexError) as e:
+                print(f"Error converting UOB specific format: {e}")
+
+        term_loan2_match = re.search(r"([\d]+)([\d]{3})([\d]{3})[-:]([\d]+)\s*(?:Term\s+Loan\s+2|TL2)", text)
+        if term_loan2_match:
+            try:
+                amount_str = "{}{}{}.{}".format(*term_loan2_match.group(1, 2, 3, 4))
+                return legacy_amount_fields("amount", amount_str, "{},{},{}.{}".format(*term_loan2_match.group(1, 2, 3, 4)))
+            except (ValueError, TypeError, IndexError) as e:
+                print(f"Error converting Term Loan 2 format: {e}")
+
+        total_match = re.search(r"([\d])([\d]{3})([\d]{3})([\d]{3})\s*TOTAL", text)
+        if total_match:
+            try:
+                amount_str = "{}{}{}{}".format(*total_match.group(1, 2, 3, 4))
+                return legacy_amount_fields("amount", amount_str, "{},{},{},{}.00".format(*total_match.group(1, 2, 3, 4)))
+            except (ValueError, TypeError, IndexError) as e:
+                print(f"Error converting Total format: {e}")
+    except Exception as e:
+        print(f"Error in UOB format extraction: {e}")
+    return {}
+
+def legacy_extract_amounts(text):
+    """Reference copy of the original extract_amounts"""
+    result = {}
+    result.update(legacy_extract_amount_from_uob_format(text))
+
+    amount_patterns = {
+        "earnest_deposit": r"[Ee]arnest\s+[Dd]eposit\s+(?:[Oo]f\s+)?(?:RM|MYR|Ringgit Malaysia)?\s*([\d,]+\.?\d{0,2})",
+        "deposit": r"[Dd]eposit\s+(?:[Oo]f\s+)?(?:RM|MYR|Ringgit Malaysia)?\s*([\d,]+\.?\d{0,2})",
+        "amount": r"[Aa]mount\s+(?:[Oo]f\s+)?(?:RM|MYR|Ringgit Malaysia)?\s*([\d,]+\.?\d{0,2})",
+        "mrta_amount": r"MRTA\s+[Aa]mount\s+(?:[Oo]f\s+)?(?:RM|MYR|Ringgit Malaysia)?\s*([\d,]+\.?\d{0,2})",
+        "balance": r"[Bb]alance\s+(?:[Oo]f\s+)?(?:RM|MYR|Ringgit Malaysia)?\s*([\d,]+\.?\d{0,2})"
+    }
+    for field, pattern in amount_patterns.items():
+        match = re.search(pattern, text)
+        if match:
+            try:
+                amount = legacy_amount_fields(field, match.group(1).replace(',', ''), match.group(1))
+                if field not in result:
+                    result.update(amount)
+            except (ValueError, TypeError) as e:
+                print(f"Error converting amount for {field}: {e}")
+
+    if "amount" not in result:
+        try:
+            facilities_section = re.search(r"Approved\s+Limit\s+(?:Banking\s+Facilities)?.*?TOTAL", text, re.DOTALL)
+            if facilities_section:
+                section_text = facilities_section.group(0)
+                term_loan_matches = re.findall(r"([\d,\.]+)\s*(?:Term\s+Loan|TL)", section_text, re.IGNORECASE)
+                if term_loan_matches and "amount" not in result:
+                    try:
+                        result.update(legacy_amount_fields("amount", term_loan_matches[0].replace(',', ''), term_loan_matches[0]))
+                    except (ValueError, TypeError) as e:
+                        print(f"Error converting term loan amount: {e}")
+                total_match = re.search(r"TOTAL\s+([\d,\.]+)", section_text, re.IGNORECASE)
+                if total_match and "amount" not in result:
+                    try:
+                        result.update(legacy_amount_fields("amount", total_match.group(1).replace(',', ''), total_match.group(1)))
+                    except (ValueError, TypeError) as e:
+                        print(f"Error converting total amount: {e}")
+
+            if "amount" not in result:
+                term_loan_match = re.search(r"(?:RM)?\s*([\d,]+(?:\.?\d{0,2}))\s*(?:Term\s+Loan|TL)", text, re.IGNORECASE)
+                if term_loan_match:
+                    try:
+                        result.update(legacy_amount_fields("amount", term_loan_match.group(1).replace(',', ''), term_loan_match.group(1)))
+                    except (ValueError, TypeError) as e:
+                        print(f"Error converting term loan amount: {e}")
+
+            if "amount" not in result:
+                special_match = re.search(r"[\"\']*(?:RM)?\s*([\d,]+)[\"\']*[\.\:][\"\']*(\d{2})[\"\']*\s*(?:Term\s+Loan|TL)", text)
+                if special_match:
+                    try:
+                        amount_str = special_match.group(1).replace(',', '') + '.' + special_match.group(2)
+                        result.update(legacy_amount_fields("amount", amount_str, "{}.{}".format(*special_match.group(1, 2))))
+                    except (ValueError, TypeError, IndexError) as e:
+                        print(f"Error converting special format amount: {e}")
+        except Exception as e:
+            print(f"Error in amount extraction: {e}")
+
+    return result
+
+def legacy_extract_address(text):
+    """Reference copy of the original extract_address"""
+    address_patterns = [
+        r"(?:located at|situate at|address[^\n]+)([^\n]+)",
+        r"(?:No\.\s*\d+[^,\n]+,[^,\n]+,[^,\n]+\d{5})",
+        r"(?:property at|situate at|located at)[^\n]*?([^\n]+(?:Road|Street|Avenue|Lane|Drive|Boulevard|Heights)[^\n]*)",
+        r"Level\s+\d+,\s+[^,\n]+,\s+[^,\n]+,\s+[^,\n]+\d{5}",
+        r"Level\s+\d+,\s+UOB\s+Plaza\s+\d\s+(?:Kuala\s+Lumpur)?\s*No\.\s*\d+[^,\n]+,[^,\n]*\d{5}"
+    ]
+    for pattern in address_patterns:
+        address_match = re.search(pattern, text, re.IGNORECASE)
+        if address_match:
+            address = address_match.group(1).strip() if len(address_match.groups()) > 0 else address_match.group(0).strip()
+            return re.sub(r'[\u2018\u2019\u201c\u201d]', '', address)
+
+    address_lines = []
+    address_started = False
+    for line in text.split('\n'):
+        if re.search(r"Level\s+\d+.*UOB\s+Plaza", line):
+            address_started = True
+            address_lines.append(line.strip())
+        elif address_started and re.search(r"^\s*No\.\s*\d+|^\s*\d{5}", line):
+            address_lines.append(line.strip())
+        elif address_started and len(address_lines) > 0 and re.search(r"\d{5}", line):
+            address_lines.append(line.strip())
+            break
+    if address_lines:
+        return " ".join(address_lines)
+    return None
+
+def legacy_search_fields(patterns, text, flags=re.IGNORECASE):
+    result = {}
+    for field, pattern in patterns.items():
+        match = re.search(pattern, text, flags)
+        if match:
+            result[field] = match.group(1).strip()
+    return result
+
+def legacy_extract_property_details(text):
+    """Reference copy of the original extract_property_details"""
+    return legacy_search_fields({
+        "HSD_No": r"HSD\s*No\.?\s*[:-]?\s*(\w+)",
+        "PTD_No": r"PTD\s*No\.?\s*[:-]?\s*(\w+)",
+        "Parcel_No": r"Parcel\s*No\.?\s*[:-]?\s*(\w+)",
+        "Unit_No": r"Unit\s*No\.?\s*[:-]?\s*(\w+)",
+        "Storey_No": r"Storey\s*No\.?\s*[:-]?\s*(\w+)",
+        "Car_Park_No": r"Car\s*Park\s*No\.?\s*[:-]?\s*(\w+)",
+        "residential_area": r"[Rr]esidential\s+[Aa]rea\s*[:-]?\s*([^,\.\n]+)"
+    }, text)
+
+def legacy_extract_location_info(text):
+    """Reference copy of the original extract_location_info"""
+    result = legacy_search_fields({
+        "district": r"[Dd]istrict\s*[Oo]f\s*([^,\.\n]+)",
+        "state": r"[Ss]tate\s*[Oo]f\s*([^,\.\n]+)",
+        "sub_district": r"[Ss]ub[\-\s][Dd]istrict\s*[Oo]f\s*([^,\.\n]+)",
+        "land_office": r"[Ll]and\s*[Oo]ffice\s*[Oo]f\s*([^,\.\n]+)",
+        "tenure": r"[Tt]enure\s*[:-]?\s*([^,\.\n]+)"
+    }, text)
+    state_match = re.search(r"(\d{5})\s+([^,\.\n]+),\s+Malaysia", text)
+    if state_match and "state" not in result:
+        result["state"] = state_match.group(2).strip()
+    return result
+
+def legacy_extract_title_info(text):
+    """Reference copy of the original extract_title_info"""
+    result = legacy_search_fields({
+        "title": r"[Tt]itle\s*[:-]?\s*([^,\.\n]+)",
+        "description": r"[Dd]escription\s*[:-]?\s*([^,\.\n]+)",
+        "type": r"[Pp]roperty\s+[Tt]ype\s*[:-]?\s*([^,\.\n]+)",
+        "category": r"[Cc]ategory\s*[:-]?\s*([^,\.\n]+)",
+        "title_description": r"[Tt]itle\s+[Dd]escription\s*[:-]?\s*([^,\.\n]+)"
+    }, text)
+    subject_match = re.search(r"Subject\s*:\s*([^\.]+)", text)
+    if subject_match and "description" not in result:
+        result["description"] = subject_match.group(1).strip()
+    return result
+
+def legacy_extract_company_info(text):
+    """Reference copy of the original extract_company_info"""
+    result = {}
+    reg_match = re.search(r"(?:Company|Registration|Co|Reg)\.?\s*No\.?[:\s]*(\d+[-\s]*\d+(?:[-\s]*[A-Z])?)", text)
+    if reg_match:
+        result["company_reg_no"] = reg_match.group(1).strip()
+    company_match = re.search(r"([A-Za-z\s]+)\s+(?:Sdn\.?\s*Bhd|Berhad)\.?\s*\((\d+)\)", text)
+    if company_match:
+        result["company_name"] = f"{company_match.group(1).strip()} Sdn Bhd ({company_match.group(2).strip()})"
+    return result
+
+def legacy_extract_fields(text):
+    """The fields the original process_document got from its regex extractors, in the same order"""
+    results = {"bank_name": legacy_extract_bank_name(text)}
+    results.update(legacy_extract_amounts(text))
+    address = legacy_extract_address(text)
+    if address:
+        results["address"] = address
+    results.update(legacy_extract_property_details(text))
+    results.update(legacy_extract_location_info(text))
+    results.update(legacy_extract_title_info(text))
+    results.update(legacy_extract_company_info(text))
+    return results
+
+# Each extractor on its own, and all of them through extract_fields, where they share
+# the TextIndex and field matches; bank_id is new and has no original to compare with
+EXTRACTOR_PAIRS = [
+    ("extract_bank_name", ee.extract_bank_name, legacy_extract_bank_name),
+    ("extract_amounts", ee.extract_amounts, legacy_extract_amounts),
+    ("extract_address", ee.extract_address, legacy_extract_address),
+    ("extract_property_details", ee.extract_property_details, legacy_extract_property_details),
+    ("extract_location_info", ee.extract_location_info, legacy_extract_location_info),
+    ("extract_title_info", ee.extract_title_info, legacy_extract_title_info),
+    ("extract_company_info", ee.extract_company_info, legacy_extract_company_info),
+    ("extract_fields", lambda text: {field: value for field, value in ee.extract_fields(text).items() if field != "bank_id"},
+     legacy_extract_fields),
+]
+
+# Pieces of the random corpus, one family per scan the extractors share, plus filler
+RANDOM_TOKENS = {
+    "amounts": [
+        "7000", "006", "00", "1", "23", "5000000", "1425000000", "12345678901", "\u0663\u0664", ".5", "1.2.3",
+        ",", ".", ":", "-", '"', "'", "RM", "RM ", "MYR", "Ringgit Malaysia", "Term Loan", "Term  Loan 2", "TERM LOAN",
+        "term loan 2", "TL", "TL2", "tl", "Tl", "(TL)", "Temtoanst", "TOTAL", "total", "TOTAL 5,000.00",
+        "Approved Limit ", "Approved\nLimit\n", "Banking Facilities", "Amount of ", "amount ", "Earnest Deposit ",
+        "Deposit of RM", "MRTA Amount ", "Balance ",
+    ],
+    "fields": [
+        "HSD No", "HSD", "PTD No.", "Parcel No:", "Unit No -", "Storey No", "Car Park No", "car park no", "No", "No.",
+        "Residential Area", "residential area:", "District of", "district Of", "State of", "STATE OF", "Sub-District of",
+        "Sub District of", "Land Office of", "Tenure", "Tenure:", "Title", "title:", "Title Description", "Description -",
+        "Property Type", "property type", "Category", "Subject:", "Subject :", "Subject", "12345", "A-1", "Kuala Lumpur",
+        "Selangor", "Freehold", "\u017f", "\u0130", "\u0131", "\u212a",
+    ],
+    "addresses": [
+        "Level", "5", "Level 3,", "Level 3 UOB Plaza", "UOB", "Plaza", "No. 7 Jalan", "No.", "No. 12, Jalan Ampang,",
+        "located at", "situate at", "property at", "Address:", "Road", "Heights", "50350", "123456", "1234567",
+        "Kuala Lumpur", ", Malaysia", "Malaysia", " 12", "\n 43000 Kajang", "\u2018", "\u201d",
+    ],
+    "banks": [
+        "United", "Overseas", "Bank", "(Malaysia)", "Bhd", "UOB", "uob", "Uob", "May", "bank", "Maybank", "MAYBANK",
+        "CIMB", "CIMB Bank", "HSBC", "RHB", "rhb bank", "Public", "Public Bank", "Berhad", "Am", "AmBank", "ambank",
+        "UOB Bank", "United Overseas Bank (MALAYSIA) BHD", "(", "\u017f", "\u0130", "\u0131", "\u212a",
+        "Company No.", "Reg No: 123456-K", "ABC Holdings Sdn Bhd (123456)", "Sdn. Bhd.", "(271809)",
+    ],
+}
+FILLER_TOKENS = [" ", "  ", "\n", ",", ".", ":", "x", "of", "12", "50350"]
+
+def compare(text):
+    """Return a description of every extractor whose output on text differs from the original"""
+    failures = []
+    for name, function, legacy_function in EXTRACTOR_PAIRS:
+        # Both print the same conversion errors; only the results are compared
+        with contextlib.redirect_stdout(io.StringIO()):
+            output, expected = function(text), legacy_function(text)
+        if output != expected:
+            failures.append(f"{name}({text!r}) = {output!r}, original gives {expected!r}")
+    return failures
+
+def check_benchmark_corpus(seed):
+    """Compare the extractors on the cleaned benchmark documents and the sample page"""
+    texts = [SAMPLE_PAGE, ee.clean_text(SAMPLE_PAGE)]
+    texts += [ee.clean_text(text) for text in generate_corpus((1, 10), seed).values()]
+    return [failure for text in texts for failure in compare(text)]
+
+def check_random_corpus(cases, seed):
+    """Compare the extractors on random texts, each built from one token family mixed with filler"""
+    rng = random.Random(seed)
+    families = list(RANDOM_TOKENS.values())
+    failures = []
+    for _ in range(cases):
+        tokens = rng.choice(families) + FILLER_TOKENS
+        text = "".join(rng.choice(tokens) + rng.choice(("", " ")) for _ in range(rng.randint(0, 30)))
+        failures.extend(compare(text))
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the regex extractors against the original implementation")
+    parser.add_argument("--cases", type=int, default=20000, help="Random texts to compare (default: 20000)")
+    parser.add_argument("--seed", type=int, default=42, help="Seed of the random and benchmark corpora (default: 42)")
+    args = parser.parse_args()
+
+    failures = check_benchmark_corpus(args.seed) + check_random_corpus(args.cases, args.seed)
+    for failure in failures[:20]:
+        print(failure)
+    if failures:
+        print(f"FAILED: {len(failures)} mismatches")
+        sys.exit(1)
+    print(f"OK: benchmark corpus and {args.cases} random texts (seed {args.seed}) match the original extractors")
+
+if __name__ == "__main__":
+    main()
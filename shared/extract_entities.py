@@ -1,111 +1,892 @@
-import spacy
 import re
+import regex
 import json
+import hashlib
+import sqlite3
+import functools
+import operator
 import os
+import pickle
 import sys
+import time
+import argparse
+import bisect
+import contextlib
+import cProfile
+import subprocess
+import threading
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 
-# Load spaCy model - using the en_core_web_sm model for pattern matching
-def load_spacy_model():
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Default spaCy model - using the en_core_web_sm model for pattern matching.
+# Override with the SPACY_MODEL environment variable (a package name, a model directory
+# or a snapshot file written by the setup command); SPACY_MODEL=none runs only the
+# regex extractors. spaCy itself is imported on first use, so runs that never need
+# NER do not pay for the import.
+DEFAULT_SPACY_MODEL = "en_core_web_sm"
+NO_MODEL = "none"
+
+# A model snapshot is the trimmed pipeline pickled to a single file. Unpickling it
+# skips spacy.load building the tokenizer twice (from the language defaults, then
+# again from disk), which is most of the model load time. A snapshot only loads with
+# the spaCy version that wrote it; otherwise the model it was made from is loaded.
+SNAPSHOT_FORMAT = 1
+
+# Only doc.ents is read from the pipeline, so everything but NER is left out at load time.
+# In en_core_web_sm the ner component has its own internal tok2vec layer, so the shared
+# tok2vec (used by tagger/parser only) can be excluded as well.
+UNUSED_PIPELINE_COMPONENTS = ["tok2vec", "tagger", "parser", "attribute_ruler", "lemmatizer", "senter"]
+
+# Bump whenever cleaning or extraction rules change so cached results are invalidated
+EXTRACTOR_VERSION = "1"
+
+# Streaming mode reads documents in blocks of STREAM_READ_SIZE characters and extracts
+# them page by page (split on Tesseract form feeds); pages longer than STREAM_CHUNK_CHARS
+# are split further at a line break so memory stays bounded
+STREAM_READ_SIZE = 64 * 1024
+STREAM_CHUNK_CHARS = 100_000
+# Streaming stops reading once all of these fields are filled (override with --fields)
+STREAM_TARGET_FIELDS = ("bank_name", "amount", "address", "district", "state")
+
+# OCR pipeline: pages are rasterised with pdftoppm and read with Tesseract on a bounded
+# pool. Each Tesseract process is limited to one OpenMP thread, so the pool size is the
+# number of cores the pipeline uses; the default leaves room on the webhook host.
+OCR_WORKERS = min(4, os.cpu_count() or 1)
+OCR_DPI = 300
+OCR_LANGUAGE = "eng"
+OCR_PAGE_SEGMENTATION_MODE = 6
+
+# Watch mode polls the directory every WATCH_INTERVAL seconds and extracts a .txt file
+# once its size and mtime are unchanged between two polls, so half-written OCR output
+# is not picked up; WATCH_WORKERS processes with a warm model do the extraction
+WATCH_INTERVAL = 0.05
+WATCH_WORKERS = min(2, os.cpu_count() or 1)
+
+# Default number of texts per nlp.pipe batch in batch mode
+NER_BATCH_SIZE = 64
+
+# Fields whose absence from the regex results sends a document through spaCy NER.
+# bank_name is not one of them: extract_fields always sets it (None when no bank is
+# found), so only a missing state decides whether NER runs.
+NER_FALLBACK_FIELDS = ("state",)
+
+# Time budgets in seconds for the regex extractors: each extractor gets EXTRACTOR_TIMEOUT,
+# capped by what is left of DOCUMENT_TIMEOUT for the whole document. Override with the
+# EXTRACT_EXTRACTOR_TIMEOUT / EXTRACT_DOCUMENT_TIMEOUT environment variables; 0 disables.
+# Long noisy OCR text can make some patterns backtrack for minutes; an extractor that runs
+# out of time is reported under "_timeouts" and the rest of the document is still extracted.
+EXTRACTOR_TIMEOUT = 5.0
+DOCUMENT_TIMEOUT = 30.0
+
+# Process-wide model registry: model name -> loaded nlp object
+_nlp_models = {}
+_active_model = None
+
+# Load spaCy model
+def load_spacy_model(model_name=DEFAULT_SPACY_MODEL, exclude=UNUSED_PIPELINE_COMPONENTS):
+    import spacy
+    
+    # Model directories are directories, so a file is a snapshot (already trimmed)
+    if os.path.isfile(model_name):
+        return load_model_snapshot(model_name)
     try:
-        nlp = spacy.load("en_core_web_sm")
+        nlp = spacy.load(model_name, exclude=exclude)
         print("SpaCy model loaded successfully")
         return nlp
-    except OSError:
-        # If model not found, download it
-        print("Downloading spaCy model...")
-        os.system("python -m spacy download en_core_web_sm")
-        try:
-            nlp = spacy.load("en_core_web_sm")
-            print("SpaCy model downloaded and loaded successfully")
+    except OSError as e:
+        # Models are installed ahead of time by the setup command, never while extracting
+        print(f"Error loading spaCy model: {e}")
+        print(f"Install it with: python {os.path.basename(__file__)} setup --model {model_name}")
+        sys.exit(1)
+
+def save_model_snapshot(nlp, path, model_name):
+    """Pickle a loaded pipeline to path, with a header naming the spaCy version and source model"""
+    import spacy
+    
+    header = {"format": SNAPSHOT_FORMAT, "spacy": spacy.__version__, "model": model_name}
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(header, f)
+        pickle.dump(nlp, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+def load_model_snapshot(path):
+    """Load a pipeline written by save_model_snapshot, or its source model if spaCy has changed since"""
+    import spacy
+    
+    with open(path, 'rb') as f:
+        header = pickle.load(f)
+        if header.get("format") == SNAPSHOT_FORMAT and header.get("spacy") == spacy.__version__:
+            nlp = pickle.load(f)
+            print("SpaCy model snapshot loaded successfully")
             return nlp
-        except Exception as e:
-            print(f"Error loading spaCy model: {e}")
-            sys.exit(1)
+    print(f"Model snapshot {path} was written by spaCy {header.get('spacy')}, not {spacy.__version__}; "
+          f"loading {header.get('model')} instead (re-run setup to refresh the snapshot)")
+    return load_spacy_model(header["model"])
+
+def use_model(model_name):
+    """Select the model used by get_nlp(); pass NO_MODEL to run regex extractors only"""
+    global _active_model
+    _active_model = model_name
+
+def set_nlp(nlp, model_name="custom"):
+    """Register a caller-provided nlp object as the process-wide model (None disables NER)"""
+    if nlp is None:
+        use_model(NO_MODEL)
+        return
+    _nlp_models[model_name] = nlp
+    use_model(model_name)
+
+def get_model_name():
+    """Return the name of the model get_nlp() will use"""
+    return _active_model or os.environ.get("SPACY_MODEL") or DEFAULT_SPACY_MODEL
+
+def get_nlp(model_name=None):
+    """Return the process-wide spaCy model, loading it lazily on first use.
+
+    The model is kept for the life of the process. Returns None in no-model mode.
+    Pass model_name to get (and keep) a model other than the selected one.
+    """
+    model_name = model_name or get_model_name()
+    if model_name.lower() == NO_MODEL:
+        return None
+    if model_name not in _nlp_models:
+        _nlp_models[model_name] = load_spacy_model(model_name)
+    return _nlp_models[model_name]
+
+# Character-level OCR fixes: curly quotes become straight quotes and
+# non-standard hyphens/dashes (U+2010-U+2015) become '-'
+OCR_CHAR_FIXES = {
+    '\u2018': "'",  # Left single quotation mark
+    '\u2019': "'",  # Right single quotation mark
+    '\u201c': '"',  # Left double quotation mark
+    '\u201d': '"',  # Right double quotation mark
+    **{chr(code): '-' for code in range(0x2010, 0x2016)},
+}
+# A single character class finds every one of them in one pass. This is much faster
+# than str.translate, which does a table lookup for every character of the document.
+OCR_CHAR_PATTERN = re.compile('[' + ''.join(OCR_CHAR_FIXES) + ']')
+
+# Word-level OCR errors in bank-specific text, applied in this order
+OCR_WORD_FIXES = {
+    "Temtoanst": "Term Loan",
+    "trest": "interest",
+    "Bark's": "Bank's",
+}
+
+OCR_DIGIT_O_PATTERN = re.compile(r'(\d)[oO](\d)')
+# Decimal points mangled by OCR. Anchoring on the last digit before the separator
+# gives the same replacements as (\d+)..., without retrying every digit of a long run.
+OCR_DECIMAL_WITH_SEPARATOR_PATTERN = re.compile(r'(\d)[,\'](\d+)[-:](\d+)')
+OCR_DECIMAL_PATTERN = re.compile(r'(\d)[-:](\d+)')
+WHITESPACE_RUN_PATTERN = re.compile(r'\s\s+')
 
 def clean_text(text):
     """Clean up OCR noise in the text"""
     # Remove common OCR artifacts
-    text = re.sub(r'CamScanner', '', text)
-    # Replace common OCR errors
-    text = re.sub(r'\u2018', "'", text)  # Replace left single quotation mark
-    text = re.sub(r'\u2019', "'", text)  # Replace right single quotation mark
-    text = re.sub(r'\u201c', '"', text)  # Replace left double quotation mark
-    text = re.sub(r'\u201d', '"', text)  # Replace right double quotation mark
-    # Replace non-standard hyphens and dashes
-    text = re.sub(r'[\u2010-\u2015]', '-', text)
+    text = text.replace('CamScanner', '')
+    # Replace curly quotes and non-standard hyphens and dashes
+    text = OCR_CHAR_PATTERN.sub(lambda m: OCR_CHAR_FIXES[m.group(0)], text)
     # Replace OCR errors in numbers - use a function to handle the replacements
-    text = re.sub(r'(\d)[oO](\d)', lambda m: m.group(1) + '0' + m.group(2), text)
+    text = OCR_DIGIT_O_PATTERN.sub(lambda m: m.group(1) + '0' + m.group(2), text)
     # Fix common OCR errors in bank-specific text
-    text = re.sub(r'Temtoanst', 'Term Loan', text)
-    text = re.sub(r'trest', 'interest', text)
-    text = re.sub(r'Bark\'s', 'Bank\'s', text)
+    for wrong, right in OCR_WORD_FIXES.items():
+        text = text.replace(wrong, right)
     # Fix common OCR errors in decimal points
-    text = re.sub(r'(\d+)[,\'](\d+)[-:](\d+)', r'\1\2.\3', text)  # Convert 7000,006:00 to 7000006.00
-    text = re.sub(r'(\d+)[-:](\d+)', r'\1.\2', text)  # Convert 7000-00 to 7000.00
+    text = OCR_DECIMAL_WITH_SEPARATOR_PATTERN.sub(r'\1\2.\3', text)  # Convert 7000,006:00 to 7000006.00
+    text = OCR_DECIMAL_PATTERN.sub(r'\1.\2', text)  # Convert 7000-00 to 7000.00
     # Clean up messy line spacing but preserve some structure
-    text = re.sub(r'\s{2,}', ' ', text)
+    text = WHITESPACE_RUN_PATTERN.sub(' ', text)
     return text.strip()
 
+# Declarative pattern registry: field -> list of pattern specs.
+# Each spec has a regex "pattern", optional re "flags" (by name) and a "priority";
+# a field's patterns are tried in ascending priority order and the first match wins.
+# An optional "keyword" is an ASCII literal that every match of the pattern starts with
+# (compared case-insensitively); FieldMatcher only tries the pattern where it occurs.
+# An optional "anchor" names another field (like "postcode") that every match starts with;
+# FieldMatcher only searches from that field's first match in the TextIndex on.
+# Extra patterns can be loaded from a JSON/YAML file with load_pattern_file().
+PATTERN_SPECS = {
+    # Bank names come from the bank dictionary (BANKS_FILE); bank_name patterns added from
+    # pattern files are searched only when no bank in the dictionary matches
+    "bank_name": [],
+    # Monetary amounts
+    "earnest_deposit": [{"pattern": r"[Ee]arnest\s+[Dd]eposit\s+(?:[Oo]f\s+)?(?:RM|MYR|Ringgit Malaysia)?\s*([\d,]+\.?\d{0,2})", "keyword": "Earnest"}],
+    "deposit": [{"pattern": r"[Dd]eposit\s+(?:[Oo]f\s+)?(?:RM|MYR|Ringgit Malaysia)?\s*([\d,]+\.?\d{0,2})", "keyword": "Deposit"}],
+    "amount": [{"pattern": r"[Aa]mount\s+(?:[Oo]f\s+)?(?:RM|MYR|Ringgit Malaysia)?\s*([\d,]+\.?\d{0,2})", "keyword": "Amount"}],
+    "mrta_amount": [{"pattern": r"MRTA\s+[Aa]mount\s+(?:[Oo]f\s+)?(?:RM|MYR|Ringgit Malaysia)?\s*([\d,]+\.?\d{0,2})", "keyword": "MRTA"}],
+    "balance": [{"pattern": r"[Bb]alance\s+(?:[Oo]f\s+)?(?:RM|MYR|Ringgit Malaysia)?\s*([\d,]+\.?\d{0,2})", "keyword": "Balance"}],
+    # Facility section that has limits and descriptions: from this heading up to the next "TOTAL"
+    "facilities_section_start": [{"pattern": r"Approved\s+Limit\s+(?:Banking\s+Facilities)?"}],
+    "facility_term_loan": [{"pattern": r"([\d,\.]+)\s*(?:Term\s+Loan|TL)", "flags": ["IGNORECASE"]}],
+    "facility_total": [{"pattern": r"TOTAL\s+([\d,\.]+)", "flags": ["IGNORECASE"]}],
+    # Amounts with Term Loan description, like "7,000,000.00 Term Loan (TL)"
+    "term_loan": [{"pattern": r"(?:RM)?\s*([\d,]+(?:\.?\d{0,2}))\s*(?:Term\s+Loan|TL)", "flags": ["IGNORECASE"],
+                   "followed_by": ["term", "tl"]}],
+    # UOB format with quotes and colons - like 7000,006:00" Term Loan
+    "term_loan_special": [{"pattern": r"[\"\']*(?:RM)?\s*([\d,]+)[\"\']*[\.\:][\"\']*(\d{2})[\"\']*\s*(?:Term\s+Loan|TL)",
+                           "followed_by": ["term", "tl"]}],
+    # UOB specific formats: "7000,006:00" Temtoanst(TL), Term Loan 2 and TOTAL
+    "uob_term_loan": [{"pattern": r"[\"\']?([\d,]+)[,\']?([\d]+)[:\"\']-?([\d]+)[\"\']?\s*(?:Term\s+Loan|Temtoanst|TL)",
+                       "followed_by": ["term", "temtoanst", "tl"]}],
+    "uob_term_loan_2": [{"pattern": r"([\d]+)([\d]{3})([\d]{3})[-:]([\d]+)\s*(?:Term\s+Loan\s+2|TL2)",
+                         "followed_by": ["term", "tl2"]}],
+    "uob_total": [{"pattern": r"([\d])([\d]{3})([\d]{3})([\d]{3})\s*TOTAL", "followed_by": ["total"]}],
+    # Address
+    "address": [
+        {"pattern": r"(?:located at|situate at|address[^\n]+)([^\n]+)", "flags": ["IGNORECASE"], "priority": 0},
+        {"pattern": r"(?:No\.\s*\d+[^,\n]+,[^,\n]+,[^,\n]+\d{5})", "flags": ["IGNORECASE"], "priority": 1},
+        {"pattern": r"(?:property at|situate at|located at)[^\n]*?([^\n]+(?:Road|Street|Avenue|Lane|Drive|Boulevard|Heights)[^\n]*)", "flags": ["IGNORECASE"], "priority": 2},
+        # UOB-specific patterns
+        {"pattern": r"Level\s+\d+,\s+[^,\n]+,\s+[^,\n]+,\s+[^,\n]+\d{5}", "flags": ["IGNORECASE"], "priority": 3},
+        {"pattern": r"Level\s+\d+,\s+UOB\s+Plaza\s+\d\s+(?:Kuala\s+Lumpur)?\s*No\.\s*\d+[^,\n]+,[^,\n]*\d{5}", "flags": ["IGNORECASE"], "priority": 4},
+    ],
+    "address_noise": [{"pattern": r"[\u2018\u2019\u201c\u201d]"}],
+    # UOB address spread over multiple lines
+    "address_uob_start": [{"pattern": r"Level\s+\d+.*UOB\s+Plaza"}],
+    "address_uob_line": [{"pattern": r"^\s*No\.\s*\d+|^\s*\d{5}"}],
+    "postcode": [{"pattern": r"\d{5}"}],
+    # Property identifiers
+    "HSD_No": [{"pattern": r"HSD\s*No\.?\s*[:-]?\s*(\w+)", "flags": ["IGNORECASE"], "keyword": "HSD"}],
+    "PTD_No": [{"pattern": r"PTD\s*No\.?\s*[:-]?\s*(\w+)", "flags": ["IGNORECASE"], "keyword": "PTD"}],
+    "Parcel_No": [{"pattern": r"Parcel\s*No\.?\s*[:-]?\s*(\w+)", "flags": ["IGNORECASE"], "keyword": "Parcel"}],
+    "Unit_No": [{"pattern": r"Unit\s*No\.?\s*[:-]?\s*(\w+)", "flags": ["IGNORECASE"], "keyword": "Unit"}],
+    "Storey_No": [{"pattern": r"Storey\s*No\.?\s*[:-]?\s*(\w+)", "flags": ["IGNORECASE"], "keyword": "Storey"}],
+    "Car_Park_No": [{"pattern": r"Car\s*Park\s*No\.?\s*[:-]?\s*(\w+)", "flags": ["IGNORECASE"], "keyword": "Car"}],
+    "residential_area": [{"pattern": r"[Rr]esidential\s+[Aa]rea\s*[:-]?\s*([^,\.\n]+)", "flags": ["IGNORECASE"], "keyword": "Residential"}],
+    # Location identifiers
+    "district": [{"pattern": r"[Dd]istrict\s*[Oo]f\s*([^,\.\n]+)", "flags": ["IGNORECASE"], "keyword": "District"}],
+    "state": [{"pattern": r"[Ss]tate\s*[Oo]f\s*([^,\.\n]+)", "flags": ["IGNORECASE"], "keyword": "State"}],
+    "sub_district": [{"pattern": r"[Ss]ub[\-\s][Dd]istrict\s*[Oo]f\s*([^,\.\n]+)", "flags": ["IGNORECASE"], "keyword": "Sub"}],
+    "land_office": [{"pattern": r"[Ll]and\s*[Oo]ffice\s*[Oo]f\s*([^,\.\n]+)", "flags": ["IGNORECASE"], "keyword": "Land"}],
+    "tenure": [{"pattern": r"[Tt]enure\s*[:-]?\s*([^,\.\n]+)", "flags": ["IGNORECASE"], "keyword": "Tenure"}],
+    # State from a UOB address: "50350 Kuala Lumpur, Malaysia"
+    "state_from_address": [{"pattern": r"(\d{5})\s+([^,\.\n]+),\s+Malaysia", "anchor": "postcode"}],
+    # Title information
+    "title": [{"pattern": r"[Tt]itle\s*[:-]?\s*([^,\.\n]+)", "flags": ["IGNORECASE"], "keyword": "Title"}],
+    "description": [{"pattern": r"[Dd]escription\s*[:-]?\s*([^,\.\n]+)", "flags": ["IGNORECASE"], "keyword": "Description"}],
+    "type": [{"pattern": r"[Pp]roperty\s+[Tt]ype\s*[:-]?\s*([^,\.\n]+)", "flags": ["IGNORECASE"], "keyword": "Property"}],
+    "category": [{"pattern": r"[Cc]ategory\s*[:-]?\s*([^,\.\n]+)", "flags": ["IGNORECASE"], "keyword": "Category"}],
+    "title_description": [{"pattern": r"[Tt]itle\s+[Dd]escription\s*[:-]?\s*([^,\.\n]+)", "flags": ["IGNORECASE"], "keyword": "Title"}],
+    # Subject line which often contains the description
+    "subject": [{"pattern": r"Subject\s*:\s*([^\.]+)", "keyword": "Subject"}],
+    # Company information
+    "company_reg_no": [{"pattern": r"(?:Company|Registration|Co|Reg)\.?\s*No\.?[:\s]*(\d+[-\s]*\d+(?:[-\s]*[A-Z])?)"}],
+    "company_name": [{"pattern": r"([A-Za-z\s]+)\s+(?:Sdn\.?\s*Bhd|Berhad)\.?\s*\((\d+)\)"}],
+}
+
+# Output fields filled by each field-per-pattern extractor, in output order
+AMOUNT_FIELDS = ("earnest_deposit", "deposit", "amount", "mrta_amount", "balance")
+PROPERTY_FIELDS = ("HSD_No", "PTD_No", "Parcel_No", "Unit_No", "Storey_No", "Car_Park_No", "residential_area")
+LOCATION_FIELDS = ("district", "state", "sub_district", "land_office", "tenure")
+TITLE_FIELDS = ("title", "description", "type", "category", "title_description")
+
+# Fields resolved together by FieldMatcher
+MATCHER_FIELDS = PROPERTY_FIELDS + LOCATION_FIELDS + ("state_from_address",) + TITLE_FIELDS + ("subject",)
+AMOUNT_MATCHER_FIELDS = ("uob_term_loan", "uob_term_loan_2", "uob_total") + AMOUNT_FIELDS + ("term_loan", "term_loan_special")
+
+# End marker of the facilities section started by "facilities_section_start"
+FACILITIES_SECTION_END = "TOTAL"
+
+# Characters OCR leaves in and around amounts, e.g. '"7000,006:00" ' or '5000000-00 ';
+# a run of them starts at a digit or comma. Compiled with regex so \d and \s mean
+# exactly what they mean in the registry patterns.
+NUMBER_RUN_CHAR_PATTERN = regex.compile(r'[\d\s,.:\'"-]')
+NUMBER_START_CHAR_PATTERN = regex.compile(r'[\d,]')
+
+def sort_pattern_specs(field_specs):
+    """Return a field's pattern specs in the order they are tried"""
+    return [spec for _, spec in sorted(enumerate(field_specs), key=lambda item: (item[1].get("priority", 0), item[0]))]
+
+def compile_pattern_specs(specs):
+    """Compile pattern specs into field -> [compiled pattern] sorted by priority
+    
+    Patterns are compiled with the regex package rather than re because it
+    can stop a match that runs past a timeout (see TimeBudget).
+    """
+    compiled = {}
+    for field, field_specs in specs.items():
+        compiled[field] = [
+            regex.compile(spec["pattern"], functools.reduce(operator.or_, (getattr(regex, flag) for flag in spec.get("flags", [])), 0))
+            for spec in sort_pattern_specs(field_specs)
+        ]
+    return compiled
+
+# Compiled once at import and shared by every extractor
+PATTERNS = compile_pattern_specs(PATTERN_SPECS)
+_loaded_pattern_files = []
+
+# Bank dictionary: one entry per bank with a canonical "id" and "name", its "aliases" and
+# common OCR "misspellings". Names are matched case-insensitively, and a name listed
+# earlier (by bank, then within a bank) wins over a later one anywhere in the document,
+# so "United Overseas Bank (Malaysia) Bhd" beats "UOB". Extra banks, or extra names for
+# a bank id, can be added from a pattern file's "banks" list.
+BANKS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "banks.json")
+
+def load_banks(path=BANKS_FILE):
+    """Return the list of banks in a bank dictionary file"""
+    with open(path, 'r', encoding='utf-8') as file:
+        return json.load(file)["banks"]
+
+def add_banks(banks, extra_banks):
+    """Merge extra bank entries into banks: names for a known id are appended to that bank"""
+    by_id = {bank["id"]: bank for bank in banks}
+    for extra in extra_banks:
+        bank = by_id.get(extra["id"])
+        if bank is None:
+            bank = by_id[extra["id"]] = {"id": extra["id"], "name": extra.get("name", extra["id"]), "aliases": [], "misspellings": []}
+            banks.append(bank)
+        for key in ("aliases", "misspellings"):
+            bank[key] = bank.get(key, []) + [name for name in extra.get(key, []) if name not in bank.get(key, [])]
+    return banks
+
+BANKS = load_banks()
+
+def load_pattern_file(path):
+    """Load extra patterns from a JSON or YAML file and add them to the registry
+    
+    The file maps field names to lists of pattern specs, e.g.
+    {"tenure": [{"pattern": "Pegangan\\s*[:-]?\\s*([^,\\.\\n]+)", "flags": ["IGNORECASE"]}]}.
+    Patterns without a priority are tried after the built-in ones. A "banks"
+    list is added to the bank dictionary (see BANKS_FILE) instead.
+    """
+    path = os.path.abspath(path)
+    if path in _loaded_pattern_files:
+        return
+    with open(path, 'r', encoding='utf-8') as file:
+        if path.endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("PyYAML is required to load YAML pattern files (pip install pyyaml)")
+            extra_specs = yaml.safe_load(file) or {}
+        else:
+            extra_specs = json.load(file)
+    
+    if "banks" in extra_specs:
+        add_banks(BANKS, extra_specs.pop("banks"))
+    for field, field_specs in extra_specs.items():
+        existing = PATTERN_SPECS.setdefault(field, [])
+        next_priority = max((spec.get("priority", 0) for spec in existing), default=-1) + 1
+        for spec in field_specs:
+            existing.append({"priority": next_priority, **spec})
+        PATTERNS[field] = compile_pattern_specs({field: existing})[field]
+    _loaded_pattern_files.append(path)
+    # The field matchers and bank dictionary are rebuilt from the updated registry on next use
+    global _field_matcher, _amount_matcher, _bank_dictionary
+    _field_matcher = None
+    _amount_matcher = None
+    _bank_dictionary = None
+    print(f"Loaded extra patterns from {path}")
+
+def extractor_version():
+    """Return EXTRACTOR_VERSION plus a fingerprint of the active pattern registry"""
+    fingerprint = hashlib.sha256(json.dumps([PATTERN_SPECS, BANKS], sort_keys=True).encode('utf-8')).hexdigest()[:12]
+    return f"{EXTRACTOR_VERSION}-{fingerprint}"
+
+class TextIndex:
+    """Line offsets of a cleaned text and the matches of fields shared by several extractors
+    
+    Built once per document so the extractors that work line by line, or
+    around postcodes, look offsets up here instead of splitting the text or
+    scanning it again. Everything is computed on first use. Lines are split
+    on '\n' like str.split('\n').
+    """
+    
+    def __init__(self, text):
+        self.text = text
+        # field -> (offset, first hit at or after offset) of the last next_hit() search
+        self._next_hits = {}
+    
+    @functools.cached_property
+    def line_starts(self):
+        starts = [0]
+        position = self.text.find('\n')
+        while position != -1:
+            starts.append(position + 1)
+            position = self.text.find('\n', position + 1)
+        return starts
+    
+    @property
+    def line_count(self):
+        return len(self.line_starts)
+    
+    def line(self, number):
+        """Return line number (counting from 0) without its line break"""
+        start = self.line_starts[number]
+        end = self.line_starts[number + 1] - 1 if number + 1 < len(self.line_starts) else len(self.text)
+        return self.text[start:end]
+    
+    def line_of(self, offset):
+        """Return the number of the line that contains offset"""
+        return bisect.bisect_right(self.line_starts, offset) - 1
+    
+    def next_hit(self, field, offset=0):
+        """Return the (start, end) of the first match of a field's patterns at or after offset, or None
+        
+        The last hit of each field is kept, so asking again for any offset up
+        to that hit (like every line before the next postcode) does not search.
+        """
+        if field in self._next_hits:
+            searched_from, hit = self._next_hits[field]
+            if searched_from <= offset and (hit is None or hit[0] >= offset):
+                return hit
+        hit = None
+        for pattern in PATTERNS.get(field, ()):
+            match = run_pattern(field, pattern, "search", self.text, offset)
+            if match and (hit is None or match.start() < hit[0]):
+                hit = match.span()
+        self._next_hits[field] = (offset, hit)
+        return hit
+    
+    def line_has_hit(self, field, number):
+        """Check whether a match of field starts on line number"""
+        hit = self.next_hit(field, self.line_starts[number])
+        return hit is not None and self.line_of(hit[0]) == number
+    
+    def first_line_matching(self, field):
+        """Return the number of the first line on which search_field(field, line) matches, or None
+        
+        Each pattern is searched over the whole text once. A match that spans a
+        line break does not count on its own, so from its first line the lines
+        are searched one by one.
+        """
+        first = None
+        for pattern in PATTERNS.get(field, ()):
+            match = run_pattern(field, pattern, "search", self.text)
+            if not match:
+                continue
+            number = self.line_of(match.start())
+            if '\n' in match.group(0):
+                last = first if first is not None else self.line_count
+                number = next((n for n in range(number, last) if run_pattern(field, pattern, "search", self.line(n))), None)
+                if number is None:
+                    continue
+            if first is None or number < first:
+                first = number
+        return first
+
+# Characters that IGNORECASE equates with an ASCII letter but str.lower() does not map to it
+CASE_FOLD_EXCEPTIONS = ('\u017f', '\u0131', '\u0130')  # long s, dotless i, dotted capital I
+
+def _followed_by(spec):
+    """Return a spec's "followed_by" words as a lowercased tuple, or None"""
+    words = spec.get("followed_by")
+    if not words:
+        return None
+    return tuple(word.lower() for word in ([words] if isinstance(words, str) else words))
+
+class FieldMatcher:
+    """Find the first match of many fields' patterns without a full regex scan per pattern
+    
+    Patterns with a "keyword" can only match where that keyword occurs, so
+    the lowercased text is searched for the keyword with str.find() (a fast
+    substring search, unlike a case-insensitive regex scan) and the pattern
+    is tried with pattern.match() only at those candidate offsets, in order.
+    Patterns with "followed_by" words match a number directly followed by
+    one of those words (like "7,000,000.00 Term Loan"), so the words are
+    found with str.find() and the pattern is only tried inside the number
+    run (NUMBER_RUN_CHAR_PATTERN characters) right before them.
+    The runs are collected once per text and shared by all such patterns.
+    Patterns with an "anchor" field are searched from that field's first
+    match in the TextIndex on (like "50350 Kuala Lumpur, Malaysia" from the
+    first postcode), and not at all when it has none.
+    The first offset that matches is exactly the match re.search() would
+    return. Other patterns, and text where lowercasing would shift offsets
+    or miss case-insensitive matches, fall back to a regular search.
+    """
+    
+    def __init__(self, fields):
+        self.fields = fields
+        # field -> [(pattern, lowercased keyword or None, followed_by words or None, anchor field or None)]
+        # in priority order
+        self.field_patterns = {}
+        for field in fields:
+            self.field_patterns[field] = [
+                (pattern, spec["keyword"].lower() if spec.get("keyword") else None, _followed_by(spec), spec.get("anchor"))
+                for spec, pattern in zip(sort_pattern_specs(PATTERN_SPECS.get(field, [])), PATTERNS.get(field, []))
+            ]
+        # Every "followed_by" word, to collect the number runs in front of them in one go
+        self.followed_by_words = sorted({
+            word for entries in self.field_patterns.values() for _, _, words, _ in entries for word in words or ()
+        })
+    
+    def find_all(self, text, index=None):
+        """Return {field: first match} for every field with a match, like search_field() per field
+        
+        index is the TextIndex of text, built here if an "anchor" pattern needs one.
+        """
+        folded = text.lower()
+        use_keywords = len(folded) == len(text) and not any(c in text for c in CASE_FOLD_EXCEPTIONS)
+        number_runs = None
+        
+        results = {}
+        for field, entries in self.field_patterns.items():
+            for pattern, keyword, followed_by, anchor in entries:
+                if anchor is not None:
+                    if index is None:
+                        index = TextIndex(text)
+                    match = self._match_at_anchor(field, pattern, text, index, anchor)
+                elif keyword is not None and use_keywords:
+                    match = self._match_at_keyword(field, pattern, keyword, text, folded)
+                elif followed_by is not None and use_keywords:
+                    if number_runs is None:
+                        number_runs = self._number_runs(self.followed_by_words, text, folded)
+                    match = self._match_in_number_runs(field, pattern, followed_by, text, folded, number_runs)
+                else:
+                    match = run_pattern(field, pattern, "search", text)
+                if match:
+                    results[field] = match
+                    break
+        return results
+    
+    @staticmethod
+    def _number_runs(words, text, folded):
+        """Return the (start, end) offsets of the number runs directly followed by any of words, in text order
+        
+        A run is the longest stretch of digits, whitespace and separators before
+        the word; it starts at its first digit or comma, as regex groups like
+        ([\d,]+) do, and runs without one are skipped.
+        """
+        in_run = NUMBER_RUN_CHAR_PATTERN.match
+        starts_run = NUMBER_START_CHAR_PATTERN.match
+        
+        runs = {}
+        for word in words:
+            end = folded.find(word)
+            while end != -1:
+                if end and end not in runs and in_run(text[end - 1]):
+                    start = end
+                    while start and in_run(text[start - 1]):
+                        start -= 1
+                    while start < end and not starts_run(text[start]):
+                        start += 1
+                    if start < end:
+                        runs[end] = start
+                end = folded.find(word, end + 1)
+        return sorted((start, end) for end, start in runs.items())
+    
+    @staticmethod
+    def _match_in_number_runs(field, pattern, followed_by, text, folded, number_runs):
+        # A match can only start inside a run (after an optional "RM"/quote prefix, which
+        # does not change the groups) and must end where the following word begins
+        for start, end in number_runs:
+            if folded.startswith(followed_by, end):
+                for position in range(start, end):
+                    match = run_pattern(field, pattern, "match", text, position)
+                    if match:
+                        return match
+        return None
+    
+    @staticmethod
+    def _match_at_anchor(field, pattern, text, index, anchor):
+        # Every match starts at an anchor match, so searching from the first one on finds
+        # the match search() would return. One search is cheaper than pattern.match() at
+        # each anchor match: regex scans ahead for the pattern's literal text on every call.
+        hit = index.next_hit(anchor)
+        if hit is None:
+            return None
+        return run_pattern(field, pattern, "search", text, hit[0])
+    
+    @staticmethod
+    def _match_at_keyword(field, pattern, keyword, text, folded):
+        position = folded.find(keyword)
+        while position != -1:
+            match = run_pattern(field, pattern, "match", text, position)
+            if match:
+                return match
+            position = folded.find(keyword, position + 1)
+        return None
+
+_field_matcher = None
+
+_amount_matcher = None
+
+def find_field_matches(text, index=None):
+    """Return the first match of every MATCHER_FIELDS field, sharing one lowercased copy of the text"""
+    global _field_matcher
+    if _field_matcher is None:
+        _field_matcher = FieldMatcher(MATCHER_FIELDS)
+    return _field_matcher.find_all(text, index)
+
+def find_amount_matches(text):
+    """Return the first match of every AMOUNT_MATCHER_FIELDS field from one pass over the number runs"""
+    global _amount_matcher
+    if _amount_matcher is None:
+        _amount_matcher = FieldMatcher(AMOUNT_MATCHER_FIELDS)
+    return _amount_matcher.find_all(text)
+
+class PatternTimeout(TimeoutError):
+    """A registry pattern ran past the time budget of the running extractor"""
+
+class TimeBudget:
+    """Time limits for the regex extractors on one document
+    
+    Each extractor started with start() may run for extractor_seconds,
+    capped by what is left of document_seconds. Registry patterns run via
+    run_pattern() get the time that is left as their regex timeout; a pattern
+    that runs out is recorded in timeouts and raises PatternTimeout.
+    """
+    
+    def __init__(self, extractor_seconds=None, document_seconds=None):
+        self.extractor_seconds = extractor_seconds or None
+        self.document_deadline = time.perf_counter() + document_seconds if document_seconds else None
+        self.deadline = self.document_deadline
+        self.extractor = None
+        self.timeouts = []
+    
+    def start(self, extractor):
+        """Start the budget of the next extractor"""
+        self.extractor = extractor
+        deadlines = [self.document_deadline]
+        if self.extractor_seconds:
+            deadlines.append(time.perf_counter() + self.extractor_seconds)
+        self.deadline = min((deadline for deadline in deadlines if deadline is not None), default=None)
+    
+    def document_exhausted(self):
+        return self.document_deadline is not None and time.perf_counter() >= self.document_deadline
+    
+    def record(self, field=None, pattern=None):
+        """Report an extractor that ran out of time, once per extractor and field"""
+        timeout = {"extractor": self.extractor, "field": field, "pattern": pattern}
+        if timeout not in self.timeouts:
+            self.timeouts.append(timeout)
+            print(f"Time budget exceeded in {self.extractor}" + (f" by the {field} pattern {pattern!r}" if field else ""))
+    
+    def run(self, field, pattern, method, *args):
+        timeout = self.deadline - time.perf_counter() if self.deadline is not None else None
+        try:
+            if timeout is not None and timeout <= 0:
+                raise TimeoutError("regex timed out")
+            return getattr(pattern, method)(*args, timeout=timeout)
+        except TimeoutError:
+            self.record(field, pattern.pattern)
+            raise PatternTimeout(f"{field} pattern ran out of time in {self.extractor}") from None
+
+# The budget of the document being extracted on this thread (see use_budget)
+_budget_state = threading.local()
+
+def time_budget(extractor_seconds=None, document_seconds=None):
+    """Start a TimeBudget for one document, with limits left as None taken from the environment or defaults"""
+    def seconds(value, name, default):
+        if value is not None:
+            return value
+        value = os.environ.get(name)
+        return float(value) if value else default
+    return TimeBudget(
+        seconds(extractor_seconds, "EXTRACT_EXTRACTOR_TIMEOUT", EXTRACTOR_TIMEOUT),
+        seconds(document_seconds, "EXTRACT_DOCUMENT_TIMEOUT", DOCUMENT_TIMEOUT),
+    )
+
+def add_timeouts(results, budget):
+    """Add the extractors that ran out of time to results as "_timeouts" """
+    if budget.timeouts:
+        results["_timeouts"] = budget.timeouts
+    return results
+
+@contextlib.contextmanager
+def use_budget(budget):
+    """Apply a TimeBudget to the registry patterns run on this thread inside the block"""
+    previous = getattr(_budget_state, "budget", None)
+    _budget_state.budget = budget
+    try:
+        yield budget
+    finally:
+        _budget_state.budget = previous
+
+def run_pattern(field, pattern, method, *args):
+    """Call pattern.<method>(*args) for a registry field within the active time budget, if any"""
+    budget = getattr(_budget_state, "budget", None)
+    if budget is None:
+        return getattr(pattern, method)(*args)
+    return budget.run(field, pattern, method, *args)
+
+def search_field(field, text):
+    """Return the first match for a field, trying its patterns in priority order"""
+    for pattern in PATTERNS.get(field, ()):
+        match = run_pattern(field, pattern, "search", text)
+        if match:
+            return match
+    return None
+
+def pattern_rank(field, match):
+    """Return the place of the pattern behind a match of field among the field's patterns in priority order"""
+    return PATTERNS[field].index(match.re)
+
+def set_rank(ranks, fields, rank):
+    """Record the rank of the rule that filled fields, when extract_fields is collecting ranks"""
+    if ranks is not None:
+        for field in fields:
+            ranks[field] = rank
+
+def trie_pattern(words):
+    """Return a regex source matching any of the lowercase words, longest first at each position
+    
+    The words are merged into a prefix tree, so the regex tries each character
+    once per position however many words there are.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+    
+    def to_pattern(node):
+        alternatives = [re.escape(char) + to_pattern(child) for char, child in sorted(node.items()) if char]
+        if not alternatives:
+            return ''
+        pattern = alternatives[0] if len(alternatives) == 1 else '(?:' + '|'.join(alternatives) + ')'
+        if '' in node:
+            # A word ends here; the longer words through this node are tried first
+            pattern = '(?:' + pattern + ')?'
+        return pattern
+    
+    return to_pattern(trie)
+
+# Maps the characters that IGNORECASE equates with an ASCII letter to that letter; after
+# it, str.lower() keeps the length of any text
+CASE_FOLD_TRANSLATION = str.maketrans({'\u017f': 's', '\u0131': 'i', '\u0130': 'i'})
+
+class BankDictionary:
+    """Bank names from the bank dictionary, matched in one pass over the text
+    
+    All names are compiled into one trie regex that runs over a lowercased
+    copy of the text, so adding names does not add scans. At each position
+    it matches the longest name; the shorter names that are a prefix of it
+    are looked up in a dict, and the name with the best priority wins (the
+    earliest one on a tie), like searching each name in priority order. The
+    trie is plain literals and runs in linear time, so it is compiled with
+    re and needs no time budget.
+    """
+    
+    def __init__(self, banks):
+        # lowercased name -> (priority, bank id), in dictionary order
+        self.names = {}
+        for bank in banks:
+            for name in bank.get("aliases", []) + bank.get("misspellings", []):
+                self.names.setdefault(name.lower(), (len(self.names), bank["id"]))
+        self.lengths = sorted({len(name) for name in self.names}, reverse=True)
+        self.pattern = re.compile(trie_pattern(self.names)) if self.names else None
+    
+    def find(self, text):
+        """Return (name as written in text, bank id) of the best bank name in text, or None"""
+        best = self.search(text)
+        return best[1:] if best else None
+    
+    def search(self, text):
+        """Return (priority, name as written in text, bank id) of the best bank name in text, or None"""
+        if self.pattern is None:
+            return None
+        # Lowercasing keeps offsets once the characters IGNORECASE folds to ASCII are mapped
+        folded = text.translate(CASE_FOLD_TRANSLATION) if any(c in text for c in CASE_FOLD_EXCEPTIONS) else text
+        folded = folded.lower()
+        best = None
+        for match in self.pattern.finditer(folded):
+            if best is not None and best[0] == 0:
+                # Nothing beats the first name of the dictionary
+                break
+            # Names can also start inside a match, where the scan does not look again
+            for start in range(match.start(), match.end()):
+                longest = match if start == match.start() else self.pattern.match(folded, start)
+                if longest is None:
+                    continue
+                for length in self.lengths:
+                    entry = self.names.get(folded[start:start + length]) if length <= longest.end() - start else None
+                    if entry is not None and (best is None or entry[0] < best[0]):
+                        best = (entry[0], text[start:start + length], entry[1])
+        return best
+
+_bank_dictionary = None
+
+def find_bank(text, ranks=None):
+    """Return (bank name as written, bank id or None) for the text, or None
+    
+    The bank dictionary is tried first; bank_name patterns from pattern files
+    are only searched when it finds nothing, and carry no bank id.
+    """
+    global _bank_dictionary
+    if _bank_dictionary is None:
+        _bank_dictionary = BankDictionary(BANKS)
+    best = _bank_dictionary.search(text)
+    if best is not None:
+        set_rank(ranks, ("bank_name", "bank_id"), (0, best[0]))
+        return best[1:]
+    match = search_field("bank_name", text)
+    if match:
+        set_rank(ranks, ("bank_name", "bank_id"), (1, pattern_rank("bank_name", match)))
+        return (match.group(0), None)
+    return None
+
 def extract_bank_name(text):
     """Extract bank name from the text"""
-    # Common bank names pattern
-    bank_patterns = [
-        r"United Overseas Bank \(Malaysia\) Bhd",
-        r"United Overseas Bank",
-        r"UOB Bank",
-        r"UOB",
-        r"Maybank",
-        r"CIMB Bank",
-        r"HSBC Bank",
-        r"RHB Bank",
-        r"Public Bank Berhad",
-        r"Public Bank",
-        r"AmBank",
-        # Add more bank names as needed
-    ]
-    
-    for pattern in bank_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            return match.group(0)
+    bank = find_bank(text)
+    if bank:
+        return bank[0]
     return None
 
-def extract_amounts(text):
-    """Extract various amounts from the text"""
+def amount_fields(field, amount):
+    """Return the value, print_as and in_word entries of an amount as written in the letter
+    
+    amount is the amount as displayed, e.g. "7,000,006.00"; its value drops the
+    commas and gets ".00" added when there is no decimal point.
+    """
+    amount_str = amount.replace(',', '')
+    if '.' not in amount_str:
+        amount_str += '.00'
+    return {
+        field: float(amount_str),
+        f"{field}_print_as": f"RM {amount}",
+        f"{field}_in_word": f"Ringgit Malaysia {amount} only",
+    }
+
+def find_facilities_section(text):
+    """Return the facilities section, from "Approved Limit" to the next TOTAL, or None"""
+    start = search_field("facilities_section_start", text)
+    if not start:
+        return None
+    end = text.find(FACILITIES_SECTION_END, start.end())
+    if end == -1:
+        return None
+    return text[start.start():end + len(FACILITIES_SECTION_END)]
+
+def extract_amounts(text, matches=None, ranks=None):
+    """Extract various amounts from the text
+    
+    matches can be passed in from find_amount_matches() to share one scan.
+    The rank of "amount" follows the order of the approaches: the UOB formats
+    (0-2), the "Amount" pattern (3), the facilities section (4) and the Term
+    Loan descriptions (5-6).
+    """
     result = {}
     
+    if matches is None:
+        matches = find_amount_matches(text)
+    
     # First try UOB-specific format extraction
-    uob_amounts = extract_amount_from_uob_format(text)
+    uob_amounts = extract_amount_from_uob_format(text, matches, ranks)
     if uob_amounts:
         result.update(uob_amounts)
     
-    # Pattern for monetary amounts
-    amount_patterns = {
-        "earnest_deposit": r"[Ee]arnest\s+[Dd]eposit\s+(?:[Oo]f\s+)?(?:RM|MYR|Ringgit Malaysia)?\s*([\d,]+\.?\d{0,2})",
-        "deposit": r"[Dd]eposit\s+(?:[Oo]f\s+)?(?:RM|MYR|Ringgit Malaysia)?\s*([\d,]+\.?\d{0,2})",
-        "amount": r"[Aa]mount\s+(?:[Oo]f\s+)?(?:RM|MYR|Ringgit Malaysia)?\s*([\d,]+\.?\d{0,2})",
-        "mrta_amount": r"MRTA\s+[Aa]mount\s+(?:[Oo]f\s+)?(?:RM|MYR|Ringgit Malaysia)?\s*([\d,]+\.?\d{0,2})",
-        "balance": r"[Bb]alance\s+(?:[Oo]f\s+)?(?:RM|MYR|Ringgit Malaysia)?\s*([\d,]+\.?\d{0,2})"
-    }
-    
     # Extract raw amount values
-    for field, pattern in amount_patterns.items():
-        match = re.search(pattern, text)
+    for field in AMOUNT_FIELDS:
+        match = matches.get(field)
         if match:
             try:
-                # Remove commas and convert to float
-                amount_str = match.group(1).replace(',', '')
-                # Add .00 if no decimal points
-                if '.' not in amount_str:
-                    amount_str += '.00'
-                amount_value = float(amount_str)
-                
+                amount = amount_fields(field, match.group(1))
                 # Only update if not already set by UOB specific extraction
                 if field not in result:
-                    result[field] = amount_value
-                    result[f"{field}_print_as"] = f"RM {match.group(1)}"
-                    result[f"{field}_in_word"] = f"Ringgit Malaysia {match.group(1)} only"
+                    result.update(amount)
+                    set_rank(ranks, amount, (3 if field == "amount" else 0, pattern_rank(field, match)))
             except (ValueError, TypeError) as e:
                 print(f"Error converting amount for {field}: {e}")
     
@@ -113,74 +894,55 @@ def extract_amounts(text):
     if "amount" not in result:
         try:
             # First approach - look for the facility section that has limits and descriptions
-            facilities_section = re.search(r"Approved\s+Limit\s+(?:Banking\s+Facilities)?.*?TOTAL", text, re.DOTALL)
+            section_text = find_facilities_section(text)
             
-            if facilities_section:
-                section_text = facilities_section.group(0)
-                
+            if section_text:
                 # Look for Term Loan amounts - UOB format usually has a specific layout
-                term_loan_matches = re.findall(r"([\d,\.]+)\s*(?:Term\s+Loan|TL)", section_text, re.IGNORECASE)
+                term_loan_matches = run_pattern("facility_term_loan", PATTERNS["facility_term_loan"][0], "findall", section_text)
                 
-                if term_loan_matches and len(term_loan_matches) > 0 and "amount" not in result:
-                    amount_str = term_loan_matches[0].replace(',', '')
-                    if '.' not in amount_str:
-                        amount_str += '.00'
-                        
+                if term_loan_matches and "amount" not in result:
                     try:
-                        amount_value = float(amount_str)
-                        result["amount"] = amount_value
-                        result["amount_print_as"] = f"RM {term_loan_matches[0]}"
-                        result["amount_in_word"] = f"Ringgit Malaysia {term_loan_matches[0]} only"
+                        amount = amount_fields("amount", term_loan_matches[0])
+                        result.update(amount)
+                        # Only the first section is looked at, so both of its amounts share one rank
+                        set_rank(ranks, amount, (4, 0))
                     except (ValueError, TypeError) as e:
                         print(f"Error converting term loan amount: {e}")
                 
                 # Look for total facility amount
-                total_match = re.search(r"TOTAL\s+([\d,\.]+)", section_text, re.IGNORECASE)
+                total_match = search_field("facility_total", section_text)
                 if total_match and "amount" not in result:
-                    total_str = total_match.group(1).replace(',', '')
-                    if '.' not in total_str:
-                        total_str += '.00'
-                        
                     try:
-                        total_value = float(total_str)
-                        result["amount"] = total_value
-                        result["amount_print_as"] = f"RM {total_match.group(1)}"
-                        result["amount_in_word"] = f"Ringgit Malaysia {total_match.group(1)} only"
+                        amount = amount_fields("amount", total_match.group(1))
+                        result.update(amount)
+                        set_rank(ranks, amount, (4, 0))
                     except (ValueError, TypeError) as e:
                         print(f"Error converting total amount: {e}")
         
             # Second approach - extract amounts with Term Loan description
             if "amount" not in result:
                 # Look for patterns like "7,000,000.00 Term Loan (TL)"
-                term_loan_pattern = r"(?:RM)?\s*([\d,]+(?:\.?\d{0,2}))\s*(?:Term\s+Loan|TL)"
-                term_loan_match = re.search(term_loan_pattern, text, re.IGNORECASE)
+                term_loan_match = matches.get("term_loan")
                 
                 if term_loan_match:
                     try:
-                        amount_str = term_loan_match.group(1).replace(',', '')
-                        if '.' not in amount_str:
-                            amount_str += '.00'
-                        amount_value = float(amount_str)
-                        result["amount"] = amount_value
-                        result["amount_print_as"] = f"RM {term_loan_match.group(1)}"
-                        result["amount_in_word"] = f"Ringgit Malaysia {term_loan_match.group(1)} only"
+                        amount = amount_fields("amount", term_loan_match.group(1))
+                        result.update(amount)
+                        set_rank(ranks, amount, (5, pattern_rank("term_loan", term_loan_match)))
                     except (ValueError, TypeError) as e:
                         print(f"Error converting term loan amount: {e}")
             
             # Third approach - extract from specific UOB format with quotes and colons
             if "amount" not in result:
                 # UOB format with quotes and colons - like 7000,006:00" Term Loan
-                special_pattern = r"[\"\']*(?:RM)?\s*([\d,]+)[\"\']*[\.\:][\"\']*(\d{2})[\"\']*\s*(?:Term\s+Loan|TL)"
-                special_match = re.search(special_pattern, text)
+                special_match = matches.get("term_loan_special")
                 
                 if special_match:
                     try:
-                        # Combine the parts like "7000,006" and "00" into "7000006.00"
-                        amount_str = special_match.group(1).replace(',', '') + '.' + special_match.group(2)
-                        amount_value = float(amount_str)
-                        result["amount"] = amount_value
-                        result["amount_print_as"] = f"RM {special_match.group(1)}.{special_match.group(2)}"
-                        result["amount_in_word"] = f"Ringgit Malaysia {special_match.group(1)}.{special_match.group(2)} only"
+                        # Combine the parts like "7000,006" and "00" into "7000,006.00"
+                        amount = amount_fields("amount", f"{special_match.group(1)}.{special_match.group(2)}")
+                        result.update(amount)
+                        set_rank(ranks, amount, (6, pattern_rank("term_loan_special", special_match)))
                     except (ValueError, TypeError, IndexError) as e:
                         print(f"Error converting special format amount: {e}")
         
@@ -189,179 +951,156 @@ def extract_amounts(text):
     
     return result
 
-def extract_address(text):
-    """Extract address information"""
-    # Patterns for address extraction
-    address_patterns = [
-        r"(?:located at|situate at|address[^\n]+)([^\n]+)",
-        r"(?:No\.\s*\d+[^,\n]+,[^,\n]+,[^,\n]+\d{5})",
-        r"(?:property at|situate at|located at)[^\n]*?([^\n]+(?:Road|Street|Avenue|Lane|Drive|Boulevard|Heights)[^\n]*)",
-        # UOB-specific patterns
-        r"Level\s+\d+,\s+[^,\n]+,\s+[^,\n]+,\s+[^,\n]+\d{5}",
-        r"Level\s+\d+,\s+UOB\s+Plaza\s+\d\s+(?:Kuala\s+Lumpur)?\s*No\.\s*\d+[^,\n]+,[^,\n]*\d{5}"
-    ]
+def extract_address(text, index=None, ranks=None):
+    """Extract address information
     
-    for pattern in address_patterns:
-        address_match = re.search(pattern, text, re.IGNORECASE)
+    index can be passed in to share one TextIndex of the text between extractors.
+    """
+    for rank, pattern in enumerate(PATTERNS["address"]):
+        address_match = run_pattern("address", pattern, "search", text)
         if address_match:
             address = address_match.group(1).strip() if len(address_match.groups()) > 0 else address_match.group(0).strip()
             # Clean up address by removing common OCR errors
-            address = re.sub(r'[\u2018\u2019\u201c\u201d]', '', address)
+            address = run_pattern("address_noise", PATTERNS["address_noise"][0], "sub", '', address)
+            set_rank(ranks, ("address",), (0, rank))
             return address
     
-    # Try to extract specific UOB address from multiple lines
-    lines = text.split('\n')
-    address_lines = []
-    address_started = False
+    # Try to extract specific UOB address from multiple lines, starting at the first "Level .. UOB Plaza" line
+    if index is None:
+        index = TextIndex(text)
+    start_line = index.first_line_matching("address_uob_start")
+    if start_line is None:
+        return None
     
-    for line in lines:
-        if re.search(r"Level\s+\d+.*UOB\s+Plaza", line):
-            address_started = True
-            address_lines.append(line.strip())
-        elif address_started and re.search(r"^\s*No\.\s*\d+|^\s*\d{5}", line):
+    address_lines = [index.line(start_line).strip()]
+    for number in range(start_line + 1, index.line_count):
+        line = index.line(number)
+        if search_field("address_uob_start", line) or search_field("address_uob_line", line):
             address_lines.append(line.strip())
-        elif address_started and len(address_lines) > 0 and re.search(r"\d{5}", line):
+        elif index.line_has_hit("postcode", number):
             address_lines.append(line.strip())
             break
     
-    if address_lines:
-        return " ".join(address_lines)
-    
-    return None
+    set_rank(ranks, ("address",), (1, 0))
+    return " ".join(address_lines)
 
-def extract_property_details(text):
-    """Extract property details like HSD_No, PTD_No, etc."""
+def extract_property_details(text, matches=None, ranks=None):
+    """Extract property details like HSD_No, PTD_No, etc.
+    
+    matches can be passed in from find_field_matches() to share one scan between extractors.
+    """
     result = {}
     
-    # Patterns for property identifiers
-    property_patterns = {
-        "HSD_No": r"HSD\s*No\.?\s*[:-]?\s*(\w+)",
-        "PTD_No": r"PTD\s*No\.?\s*[:-]?\s*(\w+)",
-        "Parcel_No": r"Parcel\s*No\.?\s*[:-]?\s*(\w+)",
-        "Unit_No": r"Unit\s*No\.?\s*[:-]?\s*(\w+)",
-        "Storey_No": r"Storey\s*No\.?\s*[:-]?\s*(\w+)",
-        "Car_Park_No": r"Car\s*Park\s*No\.?\s*[:-]?\s*(\w+)",
-        "residential_area": r"[Rr]esidential\s+[Aa]rea\s*[:-]?\s*([^,\.\n]+)"
-    }
+    if matches is None:
+        matches = find_field_matches(text)
     
-    for field, pattern in property_patterns.items():
-        match = re.search(pattern, text, re.IGNORECASE)
+    for field in PROPERTY_FIELDS:
+        match = matches.get(field)
         if match:
             result[field] = match.group(1).strip()
+            set_rank(ranks, (field,), (0, pattern_rank(field, match)))
     
     return result
 
-def extract_location_info(text):
+def extract_location_info(text, matches=None, ranks=None):
     """Extract location information like district, state, etc."""
     result = {}
     
-    # Patterns for location identifiers
-    location_patterns = {
-        "district": r"[Dd]istrict\s*[Oo]f\s*([^,\.\n]+)",
-        "state": r"[Ss]tate\s*[Oo]f\s*([^,\.\n]+)",
-        "sub_district": r"[Ss]ub[\-\s][Dd]istrict\s*[Oo]f\s*([^,\.\n]+)",
-        "land_office": r"[Ll]and\s*[Oo]ffice\s*[Oo]f\s*([^,\.\n]+)",
-        "tenure": r"[Tt]enure\s*[:-]?\s*([^,\.\n]+)"
-    }
+    if matches is None:
+        matches = find_field_matches(text)
     
-    for field, pattern in location_patterns.items():
-        match = re.search(pattern, text, re.IGNORECASE)
+    for field in LOCATION_FIELDS:
+        match = matches.get(field)
         if match:
             result[field] = match.group(1).strip()
+            set_rank(ranks, (field,), (0, pattern_rank(field, match)))
     
     # Try to extract state from UOB address
-    state_match = re.search(r"(\d{5})\s+([^,\.\n]+),\s+Malaysia", text)
+    state_match = matches.get("state_from_address")
     if state_match and "state" not in result:
         result["state"] = state_match.group(2).strip()
+        set_rank(ranks, ("state",), (1, pattern_rank("state_from_address", state_match)))
     
     return result
 
-def extract_title_info(text):
+def extract_title_info(text, matches=None, ranks=None):
     """Extract title information such as title, description, type, category"""
     result = {}
     
-    # Patterns for title information
-    title_patterns = {
-        "title": r"[Tt]itle\s*[:-]?\s*([^,\.\n]+)",
-        "description": r"[Dd]escription\s*[:-]?\s*([^,\.\n]+)",
-        "type": r"[Pp]roperty\s+[Tt]ype\s*[:-]?\s*([^,\.\n]+)",
-        "category": r"[Cc]ategory\s*[:-]?\s*([^,\.\n]+)",
-        "title_description": r"[Tt]itle\s+[Dd]escription\s*[:-]?\s*([^,\.\n]+)"
-    }
+    if matches is None:
+        matches = find_field_matches(text)
     
-    for field, pattern in title_patterns.items():
-        match = re.search(pattern, text, re.IGNORECASE)
+    for field in TITLE_FIELDS:
+        match = matches.get(field)
         if match:
             result[field] = match.group(1).strip()
+            set_rank(ranks, (field,), (0, pattern_rank(field, match)))
     
     # Extract information from the Subject line which often contains description
-    subject_match = re.search(r"Subject\s*:\s*([^\.]+)", text)
+    subject_match = matches.get("subject")
     if subject_match and "description" not in result:
         result["description"] = subject_match.group(1).strip()
+        set_rank(ranks, ("description",), (1, pattern_rank("subject", subject_match)))
     
     return result
 
-def extract_company_info(text):
+def extract_company_info(text, ranks=None):
     """Extract company information"""
     result = {}
     
     # Extract company registration number
-    reg_match = re.search(r"(?:Company|Registration|Co|Reg)\.?\s*No\.?[:\s]*(\d+[-\s]*\d+(?:[-\s]*[A-Z])?)", text)
+    reg_match = search_field("company_reg_no", text)
     if reg_match:
         result["company_reg_no"] = reg_match.group(1).strip()
+        set_rank(ranks, ("company_reg_no",), (0, pattern_rank("company_reg_no", reg_match)))
     
     # Extract company name for UOB documents
-    company_match = re.search(r"([A-Za-z\s]+)\s+(?:Sdn\.?\s*Bhd|Berhad)\.?\s*\((\d+)\)", text)
+    company_match = search_field("company_name", text)
     if company_match:
         result["company_name"] = f"{company_match.group(1).strip()} Sdn Bhd ({company_match.group(2).strip()})"
+        set_rank(ranks, ("company_name",), (0, pattern_rank("company_name", company_match)))
     
     return result
 
-def extract_amount_from_uob_format(text):
+def extract_amount_from_uob_format(text, matches=None, ranks=None):
     """Extract loan amounts from UOB's specific format"""
     result = {}
     
+    if matches is None:
+        matches = find_amount_matches(text)
+    
     try:
         # Extract Term Loan amount from the UOB specific format
         # Look for the specific format from UOB Bank-01: "7000,006:00" Temtoanst(TL)
-        term_loan_match = re.search(r"[\"\']?([\d,]+)[,\']?([\d]+)[:\"\']-?([\d]+)[\"\']?\s*(?:Term\s+Loan|Temtoanst|TL)", text)
+        term_loan_match = matches.get("uob_term_loan")
         if term_loan_match:
             try:
-                # Combine the parts like "7000", "006", "00" into "7000006.00"
-                amount_str = term_loan_match.group(1).replace(',', '') + term_loan_match.group(2) + '.' + term_loan_match.group(3)
-                amount_value = float(amount_str)
-                result["amount"] = amount_value
-                result["amount_print_as"] = f"RM {term_loan_match.group(1)},{term_loan_match.group(2)}.{term_loan_match.group(3)}"
-                result["amount_in_word"] = f"Ringgit Malaysia {term_loan_match.group(1)},{term_loan_match.group(2)}.{term_loan_match.group(3)} only"
-                return result
+                # Combine the parts like "7000", "006", "00" into "7000,006.00"
+                amount = amount_fields("amount", f"{term_loan_match.group(1)},{term_loan_match.group(2)}.{term_loan_match.group(3)}")
+                set_rank(ranks, amount, (0, pattern_rank("uob_term_loan", term_loan_match)))
+                return amount
             except (ValueError, TypeError, IndexError) as e:
                 print(f"Error converting UOB specific format: {e}")
         
         # Try another pattern for Term Loan 2
-        term_loan2_match = re.search(r"([\d]+)([\d]{3})([\d]{3})[-:]([\d]+)\s*(?:Term\s+Loan\s+2|TL2)", text)
+        term_loan2_match = matches.get("uob_term_loan_2")
         if term_loan2_match:
             try:
-                # Combine the parts like "5", "000", "000", "00" into "5000000.00"
-                amount_str = term_loan2_match.group(1) + term_loan2_match.group(2) + term_loan2_match.group(3) + '.' + term_loan2_match.group(4)
-                amount_value = float(amount_str)
-                result["amount"] = amount_value
-                result["amount_print_as"] = f"RM {term_loan2_match.group(1)},{term_loan2_match.group(2)},{term_loan2_match.group(3)}.{term_loan2_match.group(4)}"
-                result["amount_in_word"] = f"Ringgit Malaysia {term_loan2_match.group(1)},{term_loan2_match.group(2)},{term_loan2_match.group(3)}.{term_loan2_match.group(4)} only"
-                return result
+                # Combine the parts like "5", "000", "000", "00" into "5,000,000.00"
+                amount = amount_fields("amount", "{},{},{}.{}".format(*term_loan2_match.group(1, 2, 3, 4)))
+                set_rank(ranks, amount, (1, pattern_rank("uob_term_loan_2", term_loan2_match)))
+                return amount
             except (ValueError, TypeError, IndexError) as e:
                 print(f"Error converting Term Loan 2 format: {e}")
         
         # Try total pattern
-        total_match = re.search(r"([\d])([\d]{3})([\d]{3})([\d]{3})\s*TOTAL", text)
+        total_match = matches.get("uob_total")
         if total_match:
             try:
-                # Combine the parts like "1", "425", "000", "000" into "1425000000"
-                amount_str = total_match.group(1) + total_match.group(2) + total_match.group(3) + total_match.group(4)
-                amount_value = float(amount_str)
-                result["amount"] = amount_value
-                result["amount_print_as"] = f"RM {total_match.group(1)},{total_match.group(2)},{total_match.group(3)},{total_match.group(4)}.00"
-                result["amount_in_word"] = f"Ringgit Malaysia {total_match.group(1)},{total_match.group(2)},{total_match.group(3)},{total_match.group(4)}.00 only"
-                return result
+                # Combine the parts like "1", "425", "000", "000" into "1,425,000,000.00"
+                amount = amount_fields("amount", "{},{},{},{}.00".format(*total_match.group(1, 2, 3, 4)))
+                set_rank(ranks, amount, (2, pattern_rank("uob_total", total_match)))
+                return amount
             except (ValueError, TypeError, IndexError) as e:
                 print(f"Error converting Total format: {e}")
         
@@ -370,198 +1109,1500 @@ def extract_amount_from_uob_format(text):
     
     return result
 
-def process_document(file_path):
-    """Process a document file and extract all required entities"""
+def profiling_enabled():
+    """Check whether per-stage timings were requested (EXTRACT_PROFILE or --profile)"""
+    return bool(os.environ.get('EXTRACT_PROFILE'))
+
+@contextlib.contextmanager
+def timed(timings, stage):
+    """Add the wall time of the block to timings[stage] in milliseconds; a no-op when timings is None"""
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
     try:
-        with open(file_path, 'r', encoding='utf-8', errors='ignore') as file:
-            text = file.read()
-    except Exception as e:
-        print(f"Error reading file {file_path}: {e}")
-        return {}
-    
-    # Load spaCy model
-    nlp = load_spacy_model()
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + (time.perf_counter() - start) * 1000
+
+def add_timings(results, timings, start):
+    """Store the stage timings and the total since start as a _timings block in results"""
+    if timings is not None:
+        timings["total"] = (time.perf_counter() - start) * 1000
+        results["_timings"] = {stage: round(ms, 3) for stage, ms in timings.items()}
+    return results
+
+def percentile(sorted_samples, p):
+    """Return the p-th percentile (nearest rank) of an already sorted list, or None if it is empty"""
+    if not sorted_samples:
+        return None
+    return sorted_samples[min(len(sorted_samples) - 1, int(round(p / 100 * (len(sorted_samples) - 1))))]
+
+def summarize_timings(results):
+    """Aggregate the _timings blocks of a {file_name: results} mapping into count/mean/p95 per stage"""
+    samples = {}
+    for doc_results in results.values():
+        for stage, ms in doc_results.get("_timings", {}).items():
+            samples.setdefault(stage, []).append(ms)
     
-    # Clean the text
-    cleaned_text = clean_text(text)
+    summary = {}
+    for stage, values in samples.items():
+        values.sort()
+        summary[stage] = {
+            "count": len(values),
+            "mean_ms": round(sum(values) / len(values), 3),
+            "p95_ms": percentile(values, 95),
+        }
+    return summary
+
+def run_extractor(name, extractor, text, timings, *args):
+    """Run one extractor within the active time budget, returning None if it runs out of time"""
+    with timed(timings, name):
+        budget = getattr(_budget_state, "budget", None)
+        if budget is not None:
+            if budget.document_exhausted():
+                budget.extractor = name
+                budget.record()
+                return None
+            budget.start(name)
+        try:
+            return extractor(text, *args)
+        except PatternTimeout:
+            return None
+
+def extract_fields(cleaned_text, timings=None, ranks=None):
+    """Run every regex extractor over cleaned text and return the combined results
     
-    # Create a dictionary to store all extracted entities
+    When a timings dict is given, the wall time of each extractor is added to it.
+    Under a TimeBudget (see use_budget) an extractor that runs out of time adds
+    nothing and the others still run, so the results may be partial.
+    When a ranks dict is given, it gets (rule, pattern) for each field filled:
+    the place of the rule that filled it among the field's rules (0 for its
+    own patterns, higher for fallbacks like state_from_address or the Subject
+    line) and of the pattern or bank name in priority order. Over the whole
+    text the lowest rank wins, wherever it matches.
+    """
     results = {}
     
-    # Save cleaned text for debugging
-    results["_cleaned_text"] = cleaned_text[:200] + "..." if len(cleaned_text) > 200 else cleaned_text
-    
-    # Use spaCy for basic text processing
-    doc = nlp(cleaned_text)
+    # Index lines and postcodes once for the address and location extractors
+    with timed(timings, "index_text"):
+        index = TextIndex(cleaned_text)
     
-    # Extract various entities
-    results["bank_name"] = extract_bank_name(cleaned_text)
+    # Extract bank name and its canonical id
+    bank = run_extractor("find_bank", find_bank, cleaned_text, timings, ranks)
+    results["bank_name"], results["bank_id"] = bank or (None, None)
     
     # Extract amounts and their variations
-    amount_results = extract_amounts(cleaned_text)
-    results.update(amount_results)
+    amount_results = run_extractor("extract_amounts", extract_amounts, cleaned_text, timings, None, ranks)
+    results.update(amount_results or {})
     
     # Extract address
-    address = extract_address(cleaned_text)
+    address = run_extractor("extract_address", extract_address, cleaned_text, timings, index, ranks)
     if address:
         results["address"] = address
     
+    # Find property, location and title fields in a single scan
+    field_matches = run_extractor("find_field_matches", find_field_matches, cleaned_text, timings, index) or {}
+    
     # Extract property details
-    property_details = extract_property_details(cleaned_text)
-    results.update(property_details)
+    property_details = run_extractor("extract_property_details", extract_property_details, cleaned_text, timings, field_matches, ranks)
+    results.update(property_details or {})
     
     # Extract location information
-    location_info = extract_location_info(cleaned_text)
-    results.update(location_info)
+    location_info = run_extractor("extract_location_info", extract_location_info, cleaned_text, timings, field_matches, ranks)
+    results.update(location_info or {})
     
     # Extract title information
-    title_info = extract_title_info(cleaned_text)
-    results.update(title_info)
+    title_info = run_extractor("extract_title_info", extract_title_info, cleaned_text, timings, field_matches, ranks)
+    results.update(title_info or {})
     
     # Extract company information
-    company_info = extract_company_info(cleaned_text)
-    results.update(company_info)
+    company_info = run_extractor("extract_company_info", extract_company_info, cleaned_text, timings, ranks)
+    results.update(company_info or {})
+    
+    return results
+
+def needs_ner(results):
+    """Check whether any NER fallback field is still missing from the regex results"""
+    return any(field not in results for field in NER_FALLBACK_FIELDS)
+
+def apply_ner_fallbacks(results, doc):
+    """Fill fields absent from the results from spaCy ORG/GPE entities
     
-    # Use spaCy NER for additional entity extraction
+    Only absent fields are filled, not ones set to None, so for extract_fields
+    results this fills state alone; bank_name is always present.
+    """
     for ent in doc.ents:
         if ent.label_ == "ORG" and "bank_name" not in results:
             results["bank_name"] = ent.text
         elif ent.label_ == "GPE" and "state" not in results:  # Geographic/Political Entity
             results["state"] = ent.text
+    return results
+
+def read_document(file_path):
+    """Read a text document, returning None (and reporting the error) if it cannot be read"""
+    try:
+        with open(file_path, 'r', encoding='utf-8', errors='ignore') as file:
+            return file.read()
+    except Exception as e:
+        print(f"Error reading file {file_path}: {e}")
+        return None
+
+class Extractor:
+    """Reusable extraction engine: the spaCy model, the pattern set and an optional result cache
+    
+    Long-running hosts (the server, pool workers, notebooks) keep one engine
+    so every call reuses the warm model and cached results. The model comes
+    from the process-wide registry (model_name, or the selected model when
+    omitted) unless an nlp object is passed in, and is only loaded once a
+    document needs the NER fallback (or by load()). Compiled patterns are the
+    process-wide PATTERNS registry; pattern_files are loaded into it once.
+    The regex extractors run under a TimeBudget per document with the given
+    limits (None for the environment or default limits, 0 for no limit).
+    """
+    
+    def __init__(self, nlp=None, model_name=None, pattern_files=(), cache=None, extractor_timeout=None, document_timeout=None):
+        for path in pattern_files:
+            load_pattern_file(path)
+        self._nlp = nlp
+        self.model_name = model_name
+        self.cache = cache
+        self.extractor_timeout = extractor_timeout
+        self.document_timeout = document_timeout
+    
+    @property
+    def nlp(self):
+        """The spaCy model used for NER fallbacks, or None in no-model mode"""
+        if self._nlp is not None:
+            return self._nlp
+        return get_nlp(self.model_name)
+    
+    def load(self):
+        """Load the model now rather than on the first call, returning the engine"""
+        self.nlp
+        return self
+    
+    def _cache_get(self, key):
+        return self.cache.get(key) if key is not None else None
+    
+    def _cache_put(self, key, results):
+        # Partial results from a document that ran out of time are not cached
+        if key is not None and "error" not in results and "_timeouts" not in results:
+            self.cache.put(key, results)
+    
+    def _budget(self):
+        return time_budget(self.extractor_timeout, self.document_timeout)
+    
+    def _extract_text(self, text, timings, start):
+        """Clean text, run the regex extractors and the NER fallback if still needed"""
+        # Clean the text
+        with timed(timings, "clean_text"):
+            cleaned_text = clean_text(text)
+        
+        # Create a dictionary to store all extracted entities
+        results = {}
+        
+        # Save cleaned text for debugging
+        results["_cleaned_text"] = cleaned_text[:200] + "..." if len(cleaned_text) > 200 else cleaned_text
+        
+        # Extract various entities with the regex extractors
+        with use_budget(self._budget()) as budget:
+            results.update(extract_fields(cleaned_text, timings))
+        
+        # Use spaCy NER for additional entity extraction, only when a fallback field is still missing
+        if needs_ner(results) and not budget.document_exhausted():
+            # The model is loaded on first use; its load time is left out of the timings
+            load_start = time.perf_counter()
+            nlp = self.nlp
+            start += time.perf_counter() - load_start
+            if nlp is not None:
+                with timed(timings, "ner"):
+                    apply_ner_fallbacks(results, nlp(cleaned_text))
+        
+        # Remove cleaned text in final output if not in debug mode
+        if not os.environ.get('DEBUG'):
+            results.pop('_cleaned_text', None)
+        
+        return add_timings(add_timeouts(results, budget), timings, start)
+    
+    def extract(self, text):
+        """Extract all entities from OCR text"""
+        key = self.cache.key_for_text(text, self.model_name) if self.cache is not None else None
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+        
+        start = time.perf_counter()
+        timings = {} if profiling_enabled() else None
+        results = self._extract_text(text, timings, start)
+        self._cache_put(key, results)
+        return results
+    
+    def extract_file(self, file_path):
+        """Extract all entities from a text document, returning {} if it cannot be read"""
+        try:
+            key = self.cache.key_for_file(file_path, self.model_name) if self.cache is not None else None
+        except OSError:
+            key = None
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+        
+        start = time.perf_counter()
+        timings = {} if profiling_enabled() else None
+        with timed(timings, "read"):
+            text = read_document(file_path)
+        if text is None:
+            return {}
+        
+        results = self._extract_text(text, timings, start)
+        self._cache_put(key, results)
+        return results
+    
+    def extract_many(self, texts, batch_size=NER_BATCH_SIZE, n_process=1):
+        """Extract entities from many texts, returning one results dict per text in input order
+        
+        The regex extractors run per text; the texts that still need an NER
+        fallback are sent through nlp.pipe in batches of batch_size (using
+        n_process processes) instead of one nlp() call each.
+        """
+        texts = list(texts)
+        keys = [self.cache.key_for_text(text, self.model_name) for text in texts] if self.cache is not None else [None] * len(texts)
+        all_results = [self._cache_get(key) for key in keys]
+        pending = [i for i, results in enumerate(all_results) if results is None]
+        if not pending:
+            return all_results
+        
+        profiling = profiling_enabled()
+        all_timings = {}
+        cleaned_texts = {}
+        budgets = {}
+        for i in pending:
+            start = time.perf_counter()
+            timings = {} if profiling else None
+            
+            # Clean the text
+            with timed(timings, "clean_text"):
+                cleaned_texts[i] = clean_text(texts[i])
+            
+            # Save cleaned text for debugging
+            results = {"_cleaned_text": cleaned_texts[i][:200] + "..." if len(cleaned_texts[i]) > 200 else cleaned_texts[i]}
+            
+            # Extract various entities with the regex extractors
+            with use_budget(self._budget()) as budgets[i]:
+                results.update(extract_fields(cleaned_texts[i], timings))
+            all_results[i] = add_timeouts(results, budgets[i])
+            all_timings[i] = (timings, time.perf_counter() - start)
+        
+        # Use spaCy NER for the texts that still miss a fallback field, in batches
+        ner_indexes = [i for i in pending if needs_ner(all_results[i]) and not budgets[i].document_exhausted()]
+        nlp = self.nlp if ner_indexes else None
+        if nlp is not None:
+            ner_start = time.perf_counter()
+            docs = nlp.pipe((cleaned_texts[i] for i in ner_indexes), batch_size=batch_size, n_process=n_process)
+            for i, doc in zip(ner_indexes, docs):
+                apply_ner_fallbacks(all_results[i], doc)
+            if profiling and ner_indexes:
+                # nlp.pipe works on whole batches, so its time is split evenly over the texts it processed
+                ner_ms = (time.perf_counter() - ner_start) * 1000 / len(ner_indexes)
+                for i in ner_indexes:
+                    all_timings[i][0]["ner"] = ner_ms
+        
+        for i in pending:
+            results = all_results[i]
+            # Remove cleaned text in final output if not in debug mode
+            if not os.environ.get('DEBUG'):
+                results.pop('_cleaned_text', None)
+            if profiling:
+                timings, elapsed = all_timings[i]
+                results["_timings"] = {stage: round(ms, 3) for stage, ms in timings.items()}
+                results["_timings"]["total"] = round(elapsed * 1000 + timings.get("ner", 0.0), 3)
+            self._cache_put(keys[i], results)
+        
+        return all_results
+
+def process_document(file_path, nlp=None):
+    """Process a document file and extract all required entities"""
+    return Extractor(nlp).extract_file(file_path)
+
+def iter_text_chunks(file, max_chars=STREAM_CHUNK_CHARS):
+    """Yield the pages of an open text file, reading it in bounded blocks
+    
+    Pages are split on form feeds; a page longer than max_chars is split at
+    its last line break before the limit (or hard at the limit).
+    """
+    buffer = ''
+    while True:
+        block = file.read(STREAM_READ_SIZE)
+        if block:
+            buffer += block
+        while buffer:
+            form_feed = buffer.find('\f', 0, max_chars + 1)
+            if form_feed != -1:
+                cut, skip = form_feed, 1
+            elif len(buffer) > max_chars:
+                line_break = buffer.rfind('\n', 0, max_chars)
+                cut, skip = (line_break + 1, 0) if line_break > 0 else (max_chars, 0)
+            elif not block:
+                cut, skip = len(buffer), 0
+            else:
+                break
+            yield buffer[:cut]
+            buffer = buffer[cut + skip:]
+        if not block:
+            return
+
+def page_files(base):
+    """Return the per-page OCR files of a document (NAME-1.txt, NAME-2.txt, ...) in page order"""
+    directory = os.path.dirname(base) or '.'
+    if not os.path.isdir(directory):
+        return []
+    page_pattern = re.compile(re.escape(os.path.basename(base)) + r'-(\d+)\.txt$')
+    pages = []
+    for name in os.listdir(directory):
+        match = page_pattern.match(name)
+        if match:
+            pages.append((int(match.group(1)), os.path.join(directory, name)))
+    return [path for _, path in sorted(pages)]
+
+def iter_document_pages(source):
+    """Yield the pages of a document given as a file path or a list of per-page file paths"""
+    paths = [source] if isinstance(source, (str, os.PathLike)) else source
+    for path in paths:
+        with open(path, 'r', encoding='utf-8', errors='ignore') as file:
+            yield from iter_text_chunks(file)
+
+def process_document_streaming(source, nlp=None, target_fields=STREAM_TARGET_FIELDS):
+    """Extract entities page by page without holding the whole document in memory
+    
+    source is a file path or a list of per-page file paths (see page_files).
+    Each page is cleaned and extracted on its own. A field keeps the value of
+    the best rule that matched on any page read so far (see extract_fields),
+    from the earliest page on a tie, so a State of line on page 5 still wins
+    over a state taken from an address on page 1, as in process_document.
+    Reading stops once every field in target_fields is filled by its first
+    rule, or once the document time budget runs out.
+    
+    Results can still differ from process_document: matches cannot span a
+    page break, the facilities section is looked up on every page instead of
+    only at its first occurrence, and after an early stop a bank name listed
+    earlier in the bank dictionary, or a higher-priority pattern of a field,
+    on a later page is not seen.
+    """
+    start = time.perf_counter()
+    timings = {} if profiling_enabled() else None
+    
+    results = {}
+    # field -> rank of the rule that filled it
+    ranks = {}
+    budget = time_budget()
+    try:
+        for page in iter_document_pages(source):
+            with timed(timings, "clean_text"):
+                cleaned_text = clean_text(page)
+            if not cleaned_text:
+                continue
+            if "_cleaned_text" not in results:
+                # Save cleaned text of the first page for debugging
+                results["_cleaned_text"] = cleaned_text[:200] + "..." if len(cleaned_text) > 200 else cleaned_text
+            page_ranks = {}
+            with use_budget(budget):
+                page_results = extract_fields(cleaned_text, timings, page_ranks)
+            for field, value in page_results.items():
+                rank = page_ranks.get(field, (0, 0))
+                if results.get(field) is None or (value is not None and rank < ranks[field]):
+                    results[field] = value
+                    ranks[field] = rank
+            # A field filled by a fallback rule can still be replaced by a later page
+            if all(results.get(field) is not None and ranks[field][0] == 0 for field in target_fields) or budget.document_exhausted():
+                break
+        
+        # NER fallbacks run in a second pass over the pages, batched through nlp.pipe,
+        # once the regex results are final
+        if needs_ner(results) and not budget.document_exhausted():
+            # Use the process-wide spaCy model unless the caller passed one in; it is
+            # loaded on first use and its load time is left out of the timings
+            if nlp is None:
+                load_start = time.perf_counter()
+                nlp = get_nlp()
+                start += time.perf_counter() - load_start
+            if nlp is not None:
+                with timed(timings, "ner"):
+                    cleaned_pages = (cleaned for cleaned in map(clean_text, iter_document_pages(source)) if cleaned)
+                    for doc in nlp.pipe(cleaned_pages, batch_size=NER_BATCH_SIZE):
+                        apply_ner_fallbacks(results, doc)
+                        if not needs_ner(results):
+                            break
+    except OSError as e:
+        print(f"Error reading file {source}: {e}")
+        return {}
+    
+    results.setdefault("bank_name", None)
+    add_timeouts(results, budget)
     
     # Remove cleaned text in final output if not in debug mode
     if not os.environ.get('DEBUG'):
         results.pop('_cleaned_text', None)
     
-    return results
+    # Page reads are interleaved with extraction, so "read" is not split out in this mode
+    return add_timings(results, timings, start)
+
+def list_text_files(directory):
+    """Return the paths of all .txt documents in a directory, sorted by file name"""
+    file_names = sorted(
+        name for name in os.listdir(directory)
+        # Skip requirements.txt file
+        if name.endswith('.txt') and name != "requirements.txt"
+    )
+    return [os.path.join(directory, name) for name in file_names]
+
+class WorkerStartupError(RuntimeError):
+    """A pool worker could not load its model or pattern files"""
+
+# Why this worker process failed to start, set by _init_worker
+_worker_startup_error = None
+
+def _init_worker(model_name, pattern_files=()):
+    """Process pool initializer: load the model and extra patterns once per worker
+    
+    A failure here would only reach the parent as a BrokenProcessPool, so it
+    is kept and raised from every task instead (see _run_in_worker).
+    """
+    global _worker_startup_error
+    try:
+        for path in pattern_files:
+            load_pattern_file(path)
+        use_model(model_name)
+        get_nlp()
+    except SystemExit:
+        # load_spacy_model has already printed why and how to install the model
+        _worker_startup_error = (f"could not load spaCy model {model_name} in a worker process; "
+                                 f"install it with: python {os.path.basename(__file__)} setup --model {model_name}")
+    except Exception as e:
+        _worker_startup_error = f"worker process failed to start: {type(e).__name__}: {e}"
 
-def process_all_documents(directory, output_file=None):
-    """Process all text documents in a directory"""
+def _run_in_worker(function, *args):
+    """Run a task in a pool worker, raising WorkerStartupError if the worker failed to start"""
+    if _worker_startup_error is not None:
+        raise WorkerStartupError(_worker_startup_error)
+    return function(*args)
+
+def _map_groups_in_pool(groups, process_group, workers):
+    """Yield (group, outcomes) for each group of documents, in order, processed on a worker pool
+    
+    If a worker process dies (a crash or the OOM killer), the pool is rebuilt
+    and the groups that were in flight are retried one at a time, so only the
+    group that takes its worker down becomes error entries; the rest of the
+    batch carries on in parallel afterwards. A worker that cannot start
+    raises WorkerStartupError.
+    """
+    initargs = (get_model_name(), list(_loaded_pattern_files))
+    remaining = deque(groups)
+    # Groups left to run on their own after a crash: up to every task the pool had queued
+    isolate = 0
+    while remaining:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as executor:
+            broken = False
+            while remaining and not broken:
+                batch = [remaining[0]] if isolate else list(remaining)
+                futures = [executor.submit(_run_in_worker, process_group, group) for group in batch]
+                for group, future in zip(batch, futures):
+                    try:
+                        outcomes = future.result()
+                    except BrokenProcessPool as e:
+                        broken = True
+                        if not isolate:
+                            isolate = workers + 1
+                            break
+                        # The group broke the pool on its own, so it is the one that kills its worker
+                        outcomes = [({"error": f"Worker process died: {e}"}, 0.0) for _ in group]
+                        isolate = 1
+                    remaining.popleft()
+                    isolate = max(isolate - 1, 0)
+                    yield group, outcomes
+
+def _process_document_timed(file_path, stream=False, target_fields=STREAM_TARGET_FIELDS):
+    """Process one document, returning (results, seconds) and turning failures into an error entry"""
+    start = time.perf_counter()
+    try:
+        doc_results = process_document_streaming(file_path, target_fields=target_fields) if stream else process_document(file_path)
+    except Exception as e:
+        doc_results = {"error": f"{type(e).__name__}: {e}"}
+    return doc_results, time.perf_counter() - start
+
+class ResultCache:
+    """Persistent SQLite cache of extraction results keyed by document content
+    
+    Keys combine the SHA-256 of the file contents with the extractor version
+    and model, so changed files or changed extraction rules are re-extracted.
+    The least recently used entries are evicted once max_entries is exceeded.
+    """
+    
+    def __init__(self, path, max_entries=10000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        # last_used of cache hits, written with the next put() or in close(): an UPDATE per
+        # hit would hold the database write lock until the next commit and block other processes
+        self.used = {}
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # Each put is committed on its own; in WAL mode NORMAL only syncs at checkpoints,
+        # so a commit per document stays cheap and still survives the process crashing
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, results TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.conn.commit()
+    
+    @staticmethod
+    def _key(digest, model_name=None):
+        debug = "debug" if os.environ.get('DEBUG') else "nodebug"
+        return f"{digest.hexdigest()}:{extractor_version()}:{model_name or get_model_name()}:{debug}"
+    
+    @staticmethod
+    def key_for_file(file_path, model_name=None):
+        """Build the cache key for a file from its contents and the extractor configuration"""
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                digest.update(block)
+        return ResultCache._key(digest, model_name)
+    
+    @staticmethod
+    def key_for_text(text, model_name=None):
+        """Build the cache key for a text; the same as key_for_file for a file holding that text"""
+        return ResultCache._key(hashlib.sha256(text.encode('utf-8', errors='surrogatepass')), model_name)
+    
+    def get(self, key):
+        row = self.conn.execute("SELECT results FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.used[key] = time.time()
+        return json.loads(row[0])
+    
+    def put(self, key, results):
+        # Timings describe one run, not the document, so they are not cached
+        results = {field: value for field, value in results.items() if field != "_timings"}
+        self.conn.execute(
+            "INSERT OR REPLACE INTO results (key, results, last_used) VALUES (?, ?, ?)",
+            (key, json.dumps(results), time.time()),
+        )
+        self._write_used()
+        # Committed right away, so results extracted before a crash are kept
+        self.conn.commit()
+    
+    def _write_used(self):
+        self.conn.executemany("UPDATE results SET last_used = ? WHERE key = ?",
+                              [(last_used, key) for key, last_used in self.used.items()])
+        self.used.clear()
+    
+    def evict(self):
+        """Drop the least recently used entries beyond max_entries"""
+        self.conn.execute(
+            "DELETE FROM results WHERE key NOT IN (SELECT key FROM results ORDER BY last_used DESC LIMIT ?)",
+            (self.max_entries,),
+        )
+    
+    def close(self):
+        # One short write transaction for the hit timestamps and the eviction
+        try:
+            self._write_used()
+            self.evict()
+            self.conn.commit()
+        finally:
+            self.conn.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+def _process_batch_timed(file_paths, batch_size=NER_BATCH_SIZE, n_process=1):
+    """Process a group of documents with process_texts, returning [(results, seconds)] per document
+    
+    If the batch fails, its documents are processed one by one so a single
+    bad document only produces its own error entry.
+    """
+    start = time.perf_counter()
+    texts = {file_path: read_document(file_path) for file_path in file_paths}
+    readable = [file_path for file_path in file_paths if texts[file_path] is not None]
+    try:
+        batch_results = dict(zip(readable, process_texts([texts[p] for p in readable], batch_size=batch_size, n_process=n_process)))
+    except Exception:
+        return [_process_document_timed(file_path) for file_path in file_paths]
+    elapsed = (time.perf_counter() - start) / len(file_paths)
+    return [(batch_results.get(file_path, {}), elapsed) for file_path in file_paths]
+
+def _cache_document(cache, key, doc_results):
+    """Store a freshly extracted document in the result cache, unless it failed or ran out of time"""
+    if cache is not None and key is not None and "error" not in doc_results and "_timeouts" not in doc_results:
+        cache.put(key, doc_results)
+
+def _process_group_timed(file_paths, stream=False, target_fields=STREAM_TARGET_FIELDS, batch_size=None, n_process=1):
+    """Process a group of documents, batched when batch_size is set, returning [(results, seconds)]"""
+    if batch_size and not stream:
+        return _process_batch_timed(file_paths, batch_size, n_process)
+    return [_process_document_timed(file_path, stream, target_fields) for file_path in file_paths]
+
+def json_line(obj):
+    """Serialize obj as one compact JSON line, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(obj).decode('utf-8') + '\n'
+    return json.dumps(obj, separators=(',', ':')) + '\n'
+
+def open_jsonl_output(output_file, resume=False):
+    """Open a JSONL output file for writing, returning (file, names of the documents it already holds)
+    
+    With resume the file is appended to, after dropping a last line cut off by
+    a crash, and the documents already written without an error are returned
+    so they can be skipped. Otherwise the file is overwritten.
+    """
+    done = set()
+    if resume and os.path.exists(output_file):
+        with open(output_file, 'r+b') as f:
+            complete = 0
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                complete += len(line)
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(record, dict) and record.get("file") and "error" not in record.get("results", {}):
+                    done.add(record["file"])
+            f.truncate(complete)
+    return open(output_file, 'a' if resume else 'w', encoding='utf-8'), done
+
+def process_all_documents(directory, output_file=None, workers=1, cache=None, stream=False,
+                          target_fields=STREAM_TARGET_FIELDS, batch_size=None, n_process=1,
+                          jsonl_file=None, skip=()):
+    """Process all text documents in a directory
+    
+    With workers > 1 the documents are spread over a process pool; results
+    are always returned in file name order. When a ResultCache is given,
+    unchanged documents are served from it and only new or changed ones are
+    extracted (cached documents carry no _timings when profiling). With stream=True each document is extracted page by page by
+    process_document_streaming, stopping once target_fields are filled.
+    With batch_size set, documents are processed in groups of batch_size
+    by process_texts so NER runs through nlp.pipe (with n_process
+    processes when workers is 1). When profiling is enabled, the output
+    also gets a "_timings" entry summarising each stage over all documents.
+    
+    With jsonl_file (an open text file) each document is written to it as a
+    compact {"file": name, "results": {...}} line as soon as it is done, and
+    the results are not kept: only a "_timings" summary is returned (and
+    written as a last line) when profiling. Documents named in skip, like
+    those already in a resumed output, are left out.
+    """
     results = {}
+    file_paths = [file_path for file_path in list_text_files(directory) if os.path.basename(file_path) not in skip]
+    if skip:
+        print(f"Skipping {len(skip)} documents already in the output")
+    batch_start = time.perf_counter()
     
-    for file_name in os.listdir(directory):
-        # Skip requirements.txt file
-        if file_name == "requirements.txt":
-            continue
-            
-        if file_name.endswith('.txt'):
-            file_path = os.path.join(directory, file_name)
-            print(f"Processing {file_path}...")
-            doc_results = process_document(file_path)
-            results[file_name] = doc_results
+    # Serve unchanged documents from the cache
+    cached, cache_keys = {}, {}
+    if cache is not None:
+        for file_path in file_paths:
+            try:
+                cache_keys[file_path] = cache.key_for_file(file_path) + (f":stream:{','.join(target_fields)}" if stream else "")
+            except OSError as e:
+                print(f"Error reading file {file_path}: {e}")
+                continue
+            cached_results = cache.get(cache_keys[file_path])
+            if cached_results is not None:
+                cached[file_path] = cached_results
+    pending = [file_path for file_path in file_paths if file_path not in cached]
+    
+    extracted, timings = {}, {}
+    
+    def finish(file_path, doc_results):
+        """Keep a finished document for the combined output, or write it out as a JSON line"""
+        if jsonl_file is None:
+            extracted[file_path] = doc_results
+            return
+        jsonl_file.write(json_line({"file": os.path.basename(file_path), "results": doc_results}))
+        jsonl_file.flush()
+        if "_timings" in doc_results:
+            timings[file_path] = {"_timings": doc_results["_timings"]}
     
-    if output_file:
+    for file_path in cached:
+        if jsonl_file is not None:
+            finish(file_path, cached[file_path])
+    
+    # Documents are handed out in groups: batches for nlp.pipe, or one document at a time
+    group_size = batch_size if batch_size and not stream else 1
+    groups = [pending[i:i + group_size] for i in range(0, len(pending), group_size)]
+    process_group = functools.partial(_process_group_timed, stream=stream, target_fields=target_fields,
+                                      batch_size=batch_size, n_process=n_process if workers <= 1 else 1)
+    
+    if workers > 1 and len(groups) > 1:
+        print(f"Processing {len(pending)} documents with {workers} workers...")
+        for group, group_outcomes in _map_groups_in_pool(groups, process_group, workers):
+            for file_path, (doc_results, elapsed) in zip(group, group_outcomes):
+                print(f"Processed {os.path.basename(file_path)} in {elapsed:.3f}s")
+                _cache_document(cache, cache_keys.get(file_path), doc_results)
+                finish(file_path, doc_results)
+    elif groups:
+        # The model is loaded by the first document that needs NER and kept for the rest
+        for group in groups:
+            print(f"Processing {', '.join(group)}...")
+            for file_path, (doc_results, elapsed) in zip(group, process_group(group)):
+                print(f"Processed {os.path.basename(file_path)} in {elapsed:.3f}s")
+                _cache_document(cache, cache_keys.get(file_path), doc_results)
+                finish(file_path, doc_results)
+    
+    if jsonl_file is None:
+        for file_path in file_paths:
+            results[os.path.basename(file_path)] = cached[file_path] if file_path in cached else extracted[file_path]
+    
+    if file_paths:
+        elapsed = time.perf_counter() - batch_start
+        print(f"Processed {len(file_paths)} documents in {elapsed:.3f}s ({elapsed / len(file_paths):.3f}s per document)")
+    if cache is not None:
+        print(f"Cache: {cache.hits} hits, {cache.misses} misses")
+    if profiling_enabled():
+        summary = summarize_timings(results if jsonl_file is None else timings)
+        if summary:
+            print(f"{'stage':<26} {'count':>6} {'mean_ms':>10} {'p95_ms':>10}")
+            for stage, stats in summary.items():
+                print(f"{stage:<26} {stats['count']:>6} {stats['mean_ms']:>10.3f} {stats['p95_ms']:>10.3f}")
+            results["_timings"] = summary
+            if jsonl_file is not None:
+                jsonl_file.write(json_line({"_timings": summary}))
+                jsonl_file.flush()
+    
+    if output_file and jsonl_file is None:
         with open(output_file, 'w', encoding='utf-8') as f:
             json.dump(results, f, indent=2)
         print(f"Results saved to {output_file}")
     
     return results
 
+def _env_pattern_files():
+    """Pattern files listed in EXTRACT_PATTERNS, separated by os.pathsep"""
+    return [path for path in os.environ.get("EXTRACT_PATTERNS", "").split(os.pathsep) if path]
+
+def add_pattern_arguments(parser):
+    """Add the --patterns option to a command line parser"""
+    parser.add_argument("--patterns", action="append", default=_env_pattern_files(),
+                        help="JSON/YAML file of extra patterns to load at startup; may be repeated (default: $EXTRACT_PATTERNS)")
+
+def apply_pattern_arguments(args):
+    """Load the pattern files given with --patterns"""
+    for pattern_file in args.patterns:
+        load_pattern_file(pattern_file)
+
+def add_timeout_arguments(parser):
+    """Add the --extractor-timeout/--document-timeout options to a command line parser"""
+    parser.add_argument("--extractor-timeout", type=float, default=None,
+                        help=f"Seconds each regex extractor may run on a document, 0 = no limit "
+                             f"(default: $EXTRACT_EXTRACTOR_TIMEOUT or {EXTRACTOR_TIMEOUT:g})")
+    parser.add_argument("--document-timeout", type=float, default=None,
+                        help=f"Seconds all regex extractors may run on a document, 0 = no limit "
+                             f"(default: $EXTRACT_DOCUMENT_TIMEOUT or {DOCUMENT_TIMEOUT:g})")
+
+def apply_timeout_arguments(args):
+    """Apply the time budget options, through the environment so worker processes inherit them"""
+    if args.extractor_timeout is not None:
+        os.environ['EXTRACT_EXTRACTOR_TIMEOUT'] = str(args.extractor_timeout)
+    if args.document_timeout is not None:
+        os.environ['EXTRACT_DOCUMENT_TIMEOUT'] = str(args.document_timeout)
+
+def build_arg_parser():
+    """Build the command line parser for document/directory processing"""
+    parser = argparse.ArgumentParser(
+        prog="extract_entities.py",
+        usage="python extract_entities.py <document_path_or_directory> [output_file] [options]\n"
+              "       python extract_entities.py serve [--host HOST] [--port PORT]\n"
+              "       python extract_entities.py watch <directory> [--workers N]\n"
+              "       python extract_entities.py setup [--model NAME] [--snapshot FILE]\n"
+              "       python extract_entities.py pipeline <pdf_path> [output_file] [--ocr-workers N]",
+        description="Extract bank document entities from OCR text",
+        epilog="Set DEBUG=1 environment variable to include cleaned text in output. "
+               "Set EXTRACT_PROFILE=1 (or pass --profile) to include per-stage timings. "
+               "Set SPACY_MODEL=<name or path> to choose the spaCy model, or SPACY_MODEL=none for regex-only extraction.",
+    )
+    parser.add_argument("path", help="Path to a single document or directory containing documents; use '-' to read from standard input")
+    parser.add_argument("output_file", nargs="?", help="Optional path to save results as JSON")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes for directory runs (default: 1, 0 = one per CPU core)")
+    add_pattern_arguments(parser)
+    parser.add_argument("--stream", action="store_true",
+                        help="Extract page by page with bounded memory; a path of NAME also picks up NAME-1.txt, NAME-2.txt, ...")
+    parser.add_argument("--fields", type=lambda value: tuple(field.strip() for field in value.split(',') if field.strip()),
+                        default=STREAM_TARGET_FIELDS,
+                        help=f"Comma-separated fields after which --stream stops reading (default: {','.join(STREAM_TARGET_FIELDS)})")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help=f"Process directory runs in batches of N documents with NER batched through nlp.pipe (e.g. {NER_BATCH_SIZE})")
+    parser.add_argument("--ner-processes", type=int, default=1,
+                        help="Processes nlp.pipe uses in batch mode without --workers (default: 1)")
+    parser.add_argument("--cache", default=os.environ.get("EXTRACT_CACHE"),
+                        help="SQLite result cache for directory runs; unchanged files are not re-extracted (default: $EXTRACT_CACHE)")
+    parser.add_argument("--cache-size", type=int, default=10000,
+                        help="Maximum number of cached documents before the least recently used are evicted (default: 10000)")
+    parser.add_argument("--profile", action="store_true",
+                        help="Add a _timings block with the wall time of each stage and extractor to every result")
+    parser.add_argument("--cprofile", default=os.environ.get("EXTRACT_CPROFILE"),
+                        help="Write cProfile stats of the run to this file, for pstats or snakeviz; "
+                             "worker processes are not included (default: $EXTRACT_CPROFILE)")
+    parser.add_argument("--jsonl", action="store_true",
+                        help="For directories, write one compact JSON line per document as soon as it is done "
+                             "instead of one indented JSON object at the end")
+    parser.add_argument("--resume", action="store_true",
+                        help="With --jsonl and an output_file, append to it and skip the documents it already holds")
+    add_timeout_arguments(parser)
+    return parser
+
+def run_directory(directory, args, workers, cache, message):
+    """Print message and process a directory for the command line, returning its results, or None once written as JSONL"""
+    options = dict(workers=workers, cache=cache, stream=args.stream, target_fields=args.fields,
+                   batch_size=args.batch_size, n_process=args.ner_processes)
+    if not args.jsonl:
+        print(message)
+        return process_all_documents(directory, args.output_file, **options)
+    
+    if args.output_file:
+        print(message)
+        jsonl_file, done = open_jsonl_output(args.output_file, args.resume)
+        with jsonl_file:
+            process_all_documents(directory, jsonl_file=jsonl_file, skip=done, **options)
+        print(f"Results saved to {args.output_file}")
+    else:
+        # Only the JSON lines go to stdout; progress messages go to stderr
+        stdout = sys.stdout
+        with contextlib.redirect_stdout(sys.stderr):
+            print(message)
+            process_all_documents(directory, jsonl_file=stdout, **options)
+    return None
+
 def main():
     """Main function to process the documents"""
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        serve_main(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "pipeline":
+        pipeline_main(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "watch":
+        watch_main(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "setup":
+        setup_main(sys.argv[2:])
+        return
+    
+    parser = build_arg_parser()
     if len(sys.argv) < 2:
-        print("Usage: python extract_entities.py <document_path_or_directory> [output_file]")
-        print("  document_path_or_directory: Path to a single document or directory containing documents")
-        print("  output_file: Optional path to save results as JSON")
-        print("\nOptions:")
-        print("  Set DEBUG=1 environment variable to include cleaned text in output")
-        print("  Use '-' as document_path to read from standard input")
+        parser.print_help()
         return
     
-    path = sys.argv[1]
-    output_file = sys.argv[2] if len(sys.argv) > 2 else None
-    
-    if path == '-':
-        # Read from standard input
-        print("Reading from standard input...")
-        text = sys.stdin.read()
-        results = process_text(text)
-    elif os.path.isdir(path):
-        print(f"Processing all .txt files in directory: {path}")
-        results = process_all_documents(path, output_file)
-        # If output_file is provided, results are already saved in process_all_documents
-        if output_file:
-            return
-    elif os.path.exists(path):
-        results = process_document(path)
-    else:
-        # If the specific file doesn't exist but the directory does, process all files in the directory
-        dir_path = os.path.dirname(path)
-        if os.path.isdir(dir_path):
-            print(f"File {path} not found. Processing all .txt files in directory: {dir_path}")
-            results = process_all_documents(dir_path, output_file)
+    args = parser.parse_args()
+    if args.resume and not (args.jsonl and args.output_file):
+        parser.error("--resume needs --jsonl and an output_file")
+    path = args.path
+    output_file = args.output_file
+    workers = args.workers or os.cpu_count() or 1
+    apply_pattern_arguments(args)
+    if args.profile:
+        # Set through the environment so worker processes profile too
+        os.environ['EXTRACT_PROFILE'] = '1'
+    apply_timeout_arguments(args)
+    
+    cache = None
+    profiler = cProfile.Profile() if args.cprofile else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        if args.cache:
+            cache = ResultCache(args.cache, args.cache_size)
+        if path == '-':
+            # Read from standard input
+            print("Reading from standard input...")
+            text = sys.stdin.read()
+            results = process_text(text)
+        elif os.path.isdir(path):
+            results = run_directory(path, args, workers, cache, f"Processing all .txt files in directory: {path}")
             # If output_file is provided, results are already saved in process_all_documents
-            if output_file:
+            if output_file or results is None:
                 return
+        elif os.path.exists(path):
+            results = process_document_streaming(path, target_fields=args.fields) if args.stream else process_document(path)
+        elif args.stream and page_files(path):
+            # Per-page OCR output of one document, e.g. NAME-1.txt, NAME-2.txt, ...
+            results = process_document_streaming(page_files(path), target_fields=args.fields)
         else:
-            print(f"Error: Path {path} does not exist")
-            return
+            # If the specific file doesn't exist but the directory does, process all files in the directory
+            dir_path = os.path.dirname(path)
+            if os.path.isdir(dir_path):
+                results = run_directory(dir_path, args, workers, cache,
+                                        f"File {path} not found. Processing all .txt files in directory: {dir_path}")
+                # If output_file is provided, results are already saved in process_all_documents
+                if output_file or results is None:
+                    return
+            else:
+                print(f"Error: Path {path} does not exist")
+                return
     
-    if output_file:
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(results, f, indent=2)
-        print(f"Results saved to {output_file}")
-    else:
-        # Output the results as JSON to stdout
-        print(json.dumps(results, indent=2))
+        if output_file:
+            with open(output_file, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+            print(f"Results saved to {output_file}")
+        else:
+            # Output the results as JSON to stdout
+            print(json.dumps(results, indent=2))
+    except WorkerStartupError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    except sqlite3.OperationalError as e:
+        print(f"Error: result cache {args.cache}: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.cprofile)
+            print(f"cProfile stats saved to {args.cprofile}")
+        if cache is not None:
+            try:
+                cache.close()
+            except sqlite3.OperationalError as e:
+                # Results are committed as they are extracted; only hit times and eviction are lost
+                print(f"Warning: could not update result cache {args.cache}: {e}", file=sys.stderr)
 
-def process_text(text):
+def process_text(text, nlp=None):
     """Process text directly instead of reading from a file"""
-    # Load spaCy model
-    nlp = load_spacy_model()
+    return Extractor(nlp).extract(text)
+
+def process_texts(texts, nlp=None, batch_size=NER_BATCH_SIZE, n_process=1):
+    """Process many texts at once, returning one results dict per text (see Extractor.extract_many)"""
+    return Extractor(nlp).extract_many(texts, batch_size=batch_size, n_process=n_process)
+
+class LatencyStats:
+    """Rolling latency counters (p50/p99) for the extraction server"""
     
-    # Clean the text
-    cleaned_text = clean_text(text)
+    def __init__(self, window=1000):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.errors = 0
+        self.lock = threading.Lock()
     
-    # Create a dictionary to store all extracted entities
-    results = {}
+    def record(self, seconds, error=False):
+        with self.lock:
+            self.samples.append(seconds)
+            self.count += 1
+            if error:
+                self.errors += 1
     
-    # Save cleaned text for debugging
-    results["_cleaned_text"] = cleaned_text[:200] + "..." if len(cleaned_text) > 200 else cleaned_text
+    def snapshot(self):
+        """Return request counts and latency percentiles in milliseconds"""
+        with self.lock:
+            samples = sorted(self.samples)
+            count, errors = self.count, self.errors
+        
+        def percentile_ms(p):
+            value = percentile(samples, p)
+            return round(value * 1000, 3) if value is not None else None
+        
+        return {
+            "requests": count,
+            "errors": errors,
+            "window": len(samples),
+            "p50_ms": percentile_ms(50),
+            "p99_ms": percentile_ms(99),
+            "mean_ms": round(sum(samples) / len(samples) * 1000, 3) if samples else None,
+        }
+
+class ExtractionRequestHandler(BaseHTTPRequestHandler):
+    """HTTP handler for the long-running extraction server
     
-    # Use spaCy for basic text processing
-    doc = nlp(cleaned_text)
+    POST /extract with a JSON body of {"text": "..."}, {"path": "..."} or
+    {"paths": [...]} returns the same dict as process_text (or a
+    {file_name: results} mapping for "paths"). GET /stats returns latency
+    counters and GET /health reports whether the server is up.
+    """
     
-    # Extract various entities
-    results["bank_name"] = extract_bank_name(cleaned_text)
+    server_version = "ExtractEntities/1.0"
     
-    # Extract amounts and their variations
-    amount_results = extract_amounts(cleaned_text)
-    results.update(amount_results)
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif self.path == "/stats":
+            self._send_json(200, self.server.stats.snapshot())
+        else:
+            self._send_json(404, {"error": f"Unknown endpoint {self.path}"})
     
-    # Extract address
-    address = extract_address(cleaned_text)
-    if address:
-        results["address"] = address
+    def do_POST(self):
+        if self.path != "/extract":
+            self._send_json(404, {"error": f"Unknown endpoint {self.path}"})
+            return
+        
+        start = time.perf_counter()
+        status = 200
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            status, body = self._extract(payload)
+        except (ValueError, TypeError) as e:
+            status, body = 400, {"error": f"Invalid request: {e}"}
+        except Exception as e:
+            status, body = 500, {"error": str(e)}
+        finally:
+            self.server.stats.record(time.perf_counter() - start, error=status != 200)
+        self._send_json(status, body)
     
-    # Extract property details
-    property_details = extract_property_details(cleaned_text)
-    results.update(property_details)
+    def _extract(self, payload):
+        if not isinstance(payload, dict):
+            raise ValueError("expected a JSON object")
+        
+        if "text" in payload:
+            if not isinstance(payload["text"], str):
+                raise ValueError('"text" must be a string')
+            with self.server.extract_lock:
+                return 200, self.server.extractor.extract(payload["text"])
+        
+        if "path" in payload or "paths" in payload:
+            if "paths" in payload:
+                paths = payload["paths"]
+                if not isinstance(paths, list) or not paths or not all(isinstance(p, str) for p in paths):
+                    raise ValueError('"paths" must be a non-empty list of file paths')
+                # Results are keyed by file name, so two paths with the same name would overwrite each other
+                names = Counter(os.path.basename(p) for p in paths)
+                duplicates = sorted(name for name, count in names.items() if count > 1)
+                if duplicates:
+                    raise ValueError(f'"paths" has more than one file named {", ".join(duplicates)}')
+            else:
+                if not isinstance(payload["path"], str):
+                    raise ValueError('"path" must be a file path')
+                paths = [payload["path"]]
+            missing = [p for p in paths if not os.path.isfile(p)]
+            if missing:
+                return 404, {"error": f"File not found: {', '.join(missing)}"}
+            with self.server.extract_lock:
+                results = {os.path.basename(p): self.server.extractor.extract_file(p) for p in paths}
+            return 200, results if "paths" in payload else results[os.path.basename(paths[0])]
+        
+        raise ValueError('expected "text", "path" or "paths"')
     
-    # Extract location information
-    location_info = extract_location_info(cleaned_text)
-    results.update(location_info)
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+def serve(host="127.0.0.1", port=8765):
+    """Run the extraction server, keeping the spaCy model warm between requests"""
+    server = ThreadingHTTPServer((host, port), ExtractionRequestHandler)
+    # Load the model before accepting requests so the first call is not a cold start
+    server.extractor = Extractor().load()
+    server.stats = LatencyStats()
+    # spaCy pipelines are not guaranteed to be thread-safe, so extraction is serialised
+    server.extract_lock = threading.Lock()
+    print(f"Extraction server listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+def serve_main(argv):
+    """Parse the arguments of the serve command and start the server"""
+    parser = argparse.ArgumentParser(prog="extract_entities.py serve", description="Run a persistent extraction server")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on (default: 8765)")
+    add_pattern_arguments(parser)
+    add_timeout_arguments(parser)
+    args = parser.parse_args(argv)
+    apply_pattern_arguments(args)
+    apply_timeout_arguments(args)
+    serve(args.host, args.port)
+
+# The workflow's pdftoppm step writes one NAME-N.png per page (N zero-padded to the page
+# count) and its Tesseract step then writes NAME-N.txt next to each; watch mode treats
+# those .txt files as the pages of one document NAME
+PAGE_TEXT_PATTERN = re.compile(r'(.+)-(\d+)\.txt$')
+PAGE_IMAGE_PATTERN = re.compile(r'(.+)-(\d+)\.png$')
+
+def watch_output_path(file_path):
+    """Return the output_<name>.json path that watch mode writes next to a .txt document"""
+    directory, file_name = os.path.split(file_path)
+    return os.path.join(directory, f"output_{os.path.splitext(file_name)[0]}.json")
+
+def write_json_atomic(path, results):
+    """Write results as indented JSON via a temporary file, so readers never see a partial file"""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    os.replace(temp_path, path)
+
+def _process_pages_timed(page_paths):
+    """Process the per-page OCR files of one document as a single text, returning (results, seconds)
     
-    # Extract title information
-    title_info = extract_title_info(cleaned_text)
-    results.update(title_info)
+    Pages are joined in page order with blank lines between them, as the n8n
+    "Group TXT Files" step does.
+    """
+    start = time.perf_counter()
+    try:
+        texts = [read_document(page_path) for page_path in page_paths]
+        doc_results = process_text("\n\n".join(text for text in texts if text is not None))
+    except Exception as e:
+        doc_results = {"error": f"{type(e).__name__}: {e}"}
+    return doc_results, time.perf_counter() - start
+
+class DirectoryWatcher:
+    """Extract new or modified .txt documents in a directory as they appear
     
-    # Extract company information
-    company_info = extract_company_info(cleaned_text)
-    results.update(company_info)
+    The directory is polled with os.scandir; a document is submitted to the
+    process pool once the (mtime, size) of its files is the same in two polls
+    and differs from the version last extracted. A document that changes again
+    while it is being extracted is extracted again afterwards. On startup,
+    documents whose output is missing or older than the document are extracted.
     
-    # Use spaCy NER for additional entity extraction
-    for ent in doc.ents:
-        if ent.label_ == "ORG" and "bank_name" not in results:
-            results["bank_name"] = ent.text
-        elif ent.label_ == "GPE" and "state" not in results:  # Geographic/Political Entity
-            results["state"] = ent.text
+    NAME-N.txt files OCRed from NAME-N.png images are pages of one document
+    NAME, written to output_NAME.json. It is extracted once every NAME-N.png
+    has its .txt, so not before Tesseract has read the last page, and again if
+    a page changes. Any other .txt file is a document of its own.
     
-    # Remove cleaned text in final output if not in debug mode
-    if not os.environ.get('DEBUG'):
-        results.pop('_cleaned_text', None)
+    If a worker process dies, the pool is rebuilt with make_executor and the
+    documents that were in flight are retried one at a time; the one that
+    takes its worker down again gets an {"error": ...} output.
+    """
+    
+    def __init__(self, directory, make_executor, recursive=False):
+        self.directory = directory
+        self.make_executor = make_executor
+        self.executor = make_executor()
+        self.recursive = recursive
+        # Reentrant: a future that is already done runs its callback inside poll()
+        self.lock = threading.RLock()
+        # Documents are keyed by their output path. Their files, and the version
+        # ((path, (mtime_ns, size)) per file) last seen, last submitted for extraction,
+        # and in progress
+        self.documents = {}
+        self.seen = {}
+        self.done = {}
+        self.running = set()
+        # Crash recovery: whether the pool needs rebuilding, the documents to retry on
+        # their own, and the one currently being retried
+        self.broken = False
+        self.suspects = deque()
+        self.isolated = None
+        for output_path, (file_paths, version, _) in self.scan_documents().items():
+            if os.path.exists(output_path) and os.stat(output_path).st_mtime_ns >= max(mtime for _, (mtime, _) in version):
+                self.done[output_path] = version
+            self.seen[output_path] = version
+    
+    def scan(self):
+        """Return {path: (mtime_ns, size)} of the .txt files and the set of NAME-N.png page images in the directory"""
+        versions = {}
+        images = set()
+        directories = [self.directory]
+        while directories:
+            try:
+                entries = list(os.scandir(directories.pop()))
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    if entry.is_dir():
+                        if self.recursive and not entry.name.startswith('.'):
+                            directories.append(entry.path)
+                    elif entry.name.endswith('.txt') and entry.name != "requirements.txt" and not entry.name.startswith('.'):
+                        stat = entry.stat()
+                        versions[entry.path] = (stat.st_mtime_ns, stat.st_size)
+                    elif PAGE_IMAGE_PATTERN.match(entry.name):
+                        images.add(entry.path)
+                except OSError:
+                    # Removed between listing and stat
+                    continue
+        return versions, images
+    
+    def scan_documents(self):
+        """Return {output path: (file paths in page order, version, complete)} of the documents in the directory"""
+        versions, images = self.scan()
+        documents = {}
+        pages = {}
+        for file_path in versions:
+            match = PAGE_TEXT_PATTERN.match(file_path)
+            if match and file_path[:-len(".txt")] + ".png" in images:
+                pages.setdefault(match.group(1), []).append((int(match.group(2)), file_path))
+            else:
+                documents[watch_output_path(file_path)] = ([file_path], True)
+        # A page group is complete once every page image has its text; it wins over a
+        # stand-alone NAME.txt with the same output file
+        missing = {}
+        for image_path in images:
+            if image_path[:-len(".png")] + ".txt" not in versions:
+                missing[PAGE_IMAGE_PATTERN.match(image_path).group(1)] = True
+        for base, numbered in pages.items():
+            documents[watch_output_path(base + ".txt")] = ([file_path for _, file_path in sorted(numbered)], base not in missing)
+        return {
+            output_path: (file_paths, tuple((file_path, versions[file_path]) for file_path in file_paths), complete)
+            for output_path, (file_paths, complete) in documents.items()
+        }
+    
+    def poll(self):
+        """Submit the documents that changed and have stopped changing since the last poll"""
+        documents = self.scan_documents()
+        with self.lock:
+            if self.broken:
+                self._restart()
+            for output_path in list(self.seen):
+                if output_path not in documents:
+                    self.seen.pop(output_path)
+                    self.done.pop(output_path, None)
+                    self.documents.pop(output_path, None)
+            ready = []
+            for output_path, (file_paths, version, complete) in documents.items():
+                stable = self.seen.get(output_path) == version
+                self.seen[output_path] = version
+                self.documents[output_path] = file_paths
+                if stable and complete and self.done.get(output_path) != version and output_path not in self.running:
+                    ready.append(output_path)
+            
+            # After a crash nothing new starts until the documents that were in flight
+            # have been retried one at a time
+            while self.suspects and not self.running:
+                output_path = self.suspects.popleft()
+                if output_path in self.documents:
+                    self.isolated = output_path
+                    self._submit(output_path)
+            if self.suspects or self.isolated:
+                return
+            for output_path in ready:
+                self._submit(output_path)
+    
+    def _submit(self, output_path):
+        file_paths = self.documents[output_path]
+        self.done[output_path] = self.seen.get(output_path)
+        self.running.add(output_path)
+        try:
+            if watch_output_path(file_paths[0]) == output_path:
+                future = self.executor.submit(_run_in_worker, _process_document_timed, file_paths[0])
+            else:
+                future = self.executor.submit(_run_in_worker, _process_pages_timed, file_paths)
+        except BrokenProcessPool:
+            # The pool broke since the last poll: try again once it is rebuilt
+            self.done.pop(output_path, None)
+            self.running.discard(output_path)
+            self.broken = True
+            return
+        future.add_done_callback(functools.partial(self._finish, output_path, file_paths))
+    
+    def _restart(self):
+        """Replace a broken process pool with a new one"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.executor = self.make_executor()
+        self.broken = False
+        print("Worker process died; restarted the process pool")
+    
+    def _finish(self, output_path, file_paths, future):
+        name = os.path.basename(file_paths[0]) + (f" and {len(file_paths) - 1} more pages" if len(file_paths) > 1 else "")
+        try:
+            try:
+                doc_results, elapsed = future.result()
+            except BrokenProcessPool as e:
+                with self.lock:
+                    self.broken = True
+                    if output_path != self.isolated:
+                        # Retried on its own once the pool is rebuilt, to find the document that crashed it
+                        if output_path not in self.suspects:
+                            self.suspects.append(output_path)
+                        return
+                # It crashed its worker on its own as well
+                doc_results, elapsed = {"error": f"Worker process died: {e}"}, 0.0
+            write_json_atomic(output_path, doc_results)
+            print(f"Processed {name} in {elapsed:.3f}s -> {output_path}")
+        except Exception as e:
+            print(f"Error processing {name}: {e}")
+        finally:
+            with self.lock:
+                self.running.discard(output_path)
+                if output_path == self.isolated:
+                    self.isolated = None
+    
+    def run(self, interval=WATCH_INTERVAL):
+        """Poll until interrupted"""
+        while True:
+            self.poll()
+            time.sleep(interval)
+    
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+def watch(directory, workers=WATCH_WORKERS, interval=WATCH_INTERVAL, recursive=False):
+    """Watch a directory and write output_<name>.json next to each new or modified .txt document"""
+    make_executor = functools.partial(ProcessPoolExecutor, max_workers=workers, initializer=_init_worker,
+                                      initargs=(get_model_name(), list(_loaded_pattern_files)))
+    watcher = DirectoryWatcher(directory, make_executor, recursive)
+    try:
+        # Start the workers and load their models before watching, so the first document is not a cold start
+        watcher.executor.submit(_run_in_worker, get_model_name).result()
+        print(f"Watching {directory} for .txt documents with {workers} workers")
+        watcher.run(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+
+def watch_main(argv):
+    """Parse the arguments of the watch command and start watching"""
+    parser = argparse.ArgumentParser(prog="extract_entities.py watch",
+                                     description="Extract new or modified .txt documents in a directory as they appear")
+    parser.add_argument("directory", help="Directory to watch, e.g. /data/shared")
+    parser.add_argument("--workers", type=int, default=WATCH_WORKERS,
+                        help=f"Worker processes, each with its own warm model (default: {WATCH_WORKERS})")
+    parser.add_argument("--interval", type=float, default=WATCH_INTERVAL,
+                        help=f"Seconds between directory polls (default: {WATCH_INTERVAL:g})")
+    parser.add_argument("--recursive", action="store_true", help="Also watch subdirectories")
+    add_pattern_arguments(parser)
+    add_timeout_arguments(parser)
+    args = parser.parse_args(argv)
+    if not os.path.isdir(args.directory):
+        parser.error(f"{args.directory} is not a directory")
+    apply_pattern_arguments(args)
+    apply_timeout_arguments(args)
+    try:
+        watch(args.directory, workers=max(args.workers, 1), interval=args.interval, recursive=args.recursive)
+    except WorkerStartupError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+def setup_main(argv):
+    """Install the spaCy model ahead of time and optionally write a snapshot of the trimmed pipeline"""
+    parser = argparse.ArgumentParser(prog="extract_entities.py setup",
+                                     description="Download the spaCy model if it is not installed yet, "
+                                                 "so extraction never has to download it at request time")
+    parser.add_argument("--model", default=os.environ.get("SPACY_MODEL") or DEFAULT_SPACY_MODEL,
+                        help=f"spaCy model package or directory (default: $SPACY_MODEL or {DEFAULT_SPACY_MODEL})")
+    parser.add_argument("--snapshot",
+                        help="Also pickle the trimmed pipeline to this file; set SPACY_MODEL to it for a faster model load")
+    args = parser.parse_args(argv)
+    if args.model.lower() == NO_MODEL:
+        parser.error("SPACY_MODEL=none needs no setup")
+    if os.path.isfile(args.model):
+        parser.error(f"{args.model} is already a model snapshot")
+    
+    import spacy
     
+    if not os.path.isdir(args.model) and not spacy.util.is_package(args.model):
+        print(f"Downloading spaCy model {args.model}...")
+        completed = subprocess.run([sys.executable, "-m", "spacy", "download", args.model])
+        if completed.returncode != 0:
+            print(f"Error downloading spaCy model {args.model}")
+            sys.exit(completed.returncode)
+    nlp = load_spacy_model(args.model)
+    if args.snapshot:
+        save_model_snapshot(nlp, args.snapshot, args.model)
+        print(f"Model snapshot saved to {args.snapshot}; set SPACY_MODEL={args.snapshot} to use it")
+
+def _run_command(command, **kwargs):
+    """Run an external command, raising RuntimeError with its stderr if it fails"""
+    completed = subprocess.run(command, capture_output=True, **kwargs)
+    if completed.returncode != 0:
+        error = completed.stderr.decode('utf-8', errors='ignore').strip()
+        raise RuntimeError(f"{command[0]} failed with exit code {completed.returncode}: {error}")
+    return completed.stdout
+
+def read_pdf(source):
+    """Read a whole PDF into memory from a path, or from standard input when source is -"""
+    if source == "-":
+        return sys.stdin.buffer.read()
+    return Path(source).read_bytes()
+
+def pdf_page_count(pdf_bytes):
+    """Return the number of pages in an in-memory PDF using pdfinfo"""
+    info = _run_command(["pdfinfo", "-"], input=pdf_bytes).decode('utf-8', errors='ignore')
+    match = re.search(r"^Pages:\s+(\d+)", info, re.MULTILINE)
+    if not match:
+        raise RuntimeError("Could not read the page count of the PDF")
+    return int(match.group(1))
+
+def ocr_pdf_page(pdf_bytes, page_number, dpi=OCR_DPI, lang=OCR_LANGUAGE, psm=OCR_PAGE_SEGMENTATION_MODE):
+    """Rasterise one PDF page with pdftoppm and OCR it with Tesseract, returning (text, seconds)
+    
+    The PDF, the page image and the text are all passed through pipes, so
+    nothing is written to disk.
+    """
+    start = time.perf_counter()
+    # With no file arguments pdftoppm reads the PDF from stdin and writes the image to stdout
+    image = _run_command(["pdftoppm", "-png", "-r", str(dpi), "-f", str(page_number), "-l", str(page_number),
+                          "-singlefile"], input=pdf_bytes)
+    text = _run_command(["tesseract", "stdin", "stdout", "-l", lang, "--oem", "3", "--psm", str(psm)],
+                        input=image, env={**os.environ, "OMP_THREAD_LIMIT": "1"})
+    return text.decode('utf-8', errors='ignore'), time.perf_counter() - start
+
+def ocr_pdf(pdf_bytes, workers=OCR_WORKERS, **ocr_options):
+    """OCR every page of an in-memory PDF on a bounded worker pool, returning (text, [seconds per page])
+    
+    Pages are joined in page order with blank lines between them, as the
+    n8n "Group TXT Files" step does. Timings are reported on stderr.
+    """
+    page_count = pdf_page_count(pdf_bytes)
+    # Threads are enough here: each page runs in its own pdftoppm/tesseract processes
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        pages = list(executor.map(
+            lambda page_number: ocr_pdf_page(pdf_bytes, page_number, **ocr_options),
+            range(1, page_count + 1),
+        ))
+    
+    for page_number, (_, elapsed) in enumerate(pages, start=1):
+        print(f"OCR page {page_number}/{page_count} in {elapsed:.3f}s", file=sys.stderr)
+    return "\n\n".join(text for text, _ in pages), [elapsed for _, elapsed in pages]
+
+def process_pdf(pdf_bytes, nlp=None, workers=OCR_WORKERS, **ocr_options):
+    """Run the whole chain for an in-memory PDF: pdftoppm, Tesseract and entity extraction"""
+    start = time.perf_counter()
+    text, page_times = ocr_pdf(pdf_bytes, workers=workers, **ocr_options)
+    ocr_elapsed = time.perf_counter() - start
+    print(f"OCR of {len(page_times)} pages took {ocr_elapsed:.3f}s with {workers} workers "
+          f"({sum(page_times) / max(1, len(page_times)):.3f}s per page)", file=sys.stderr)
+    results = process_text(text, nlp=nlp)
+    if "_timings" in results:
+        results["_timings"]["ocr"] = round(ocr_elapsed * 1000, 3)
+        results["_timings"]["total"] = round(results["_timings"]["total"] + ocr_elapsed * 1000, 3)
     return results
 
+def pipeline_main(argv):
+    """Parse the arguments of the pipeline command and process one PDF end to end"""
+    parser = argparse.ArgumentParser(prog="extract_entities.py pipeline",
+                                     description="OCR a PDF and extract its entities in one command")
+    parser.add_argument("pdf_path", help="PDF document to process, or - to read it from standard input")
+    parser.add_argument("output_file", nargs="?", help="Optional path to save results as JSON")
+    parser.add_argument("--ocr-workers", type=int, default=OCR_WORKERS,
+                        help=f"Pages OCRed concurrently (default: {OCR_WORKERS})")
+    parser.add_argument("--dpi", type=int, default=OCR_DPI, help=f"Rasterisation resolution (default: {OCR_DPI})")
+    parser.add_argument("--lang", default=OCR_LANGUAGE, help=f"Tesseract language(s), e.g. eng+msa (default: {OCR_LANGUAGE})")
+    parser.add_argument("--psm", type=int, default=OCR_PAGE_SEGMENTATION_MODE,
+                        help=f"Tesseract page segmentation mode (default: {OCR_PAGE_SEGMENTATION_MODE})")
+    add_pattern_arguments(parser)
+    add_timeout_arguments(parser)
+    args = parser.parse_args(argv)
+    apply_pattern_arguments(args)
+    apply_timeout_arguments(args)
+    
+    # Only the final JSON goes to stdout; model loading messages and errors go to stderr
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            results = process_pdf(read_pdf(args.pdf_path), workers=args.ocr_workers,
+                                  dpi=args.dpi, lang=args.lang, psm=args.psm)
+        except (OSError, RuntimeError) as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+    
+    if args.output_file:
+        with open(args.output_file, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved to {args.output_file}", file=sys.stderr)
+    else:
+        print(json.dumps(results, indent=2))
+
 if __name__ == "__main__":
     main() 
\ No newline at end of file